@@ -1,5 +1,18 @@
 
 let chart;
+let profile = null; // perfil de /profile: tipos inferidos sobre todas las filas
+
+const API_BASE = "http://localhost:8000";
+
+async function loadProfile(path) {
+  // si la API no esta arriba o no hay perfil, se cae a detectType por muestra
+  try {
+    const res = await fetch(`${API_BASE}/profile?source=${encodeURIComponent(path.split("/").pop())}`);
+    profile = res.ok ? await res.json() : null;
+  } catch (e) {
+    profile = null;
+  }
+}
 
 async function loadCSV(path) {
   const res = await fetch(path);
@@ -12,7 +25,11 @@ function getColumns(data) {
   return Object.keys(data[0]);
 }
 
-function detectType(values) {
+function detectType(values, col) {
+  const info = profile && col && profile.columns[col];
+  if (info && info.inferred_type) {
+    return ["integer", "float"].includes(info.inferred_type) ? "numérica" : "categórica";
+  }
   const sample = values.slice(0, 20).filter(v => v !== "" && v !== null);
   const numeric = sample.every(v => !isNaN(parseFloat(v)));
   return numeric ? "numérica" : "categórica";
@@ -22,7 +39,7 @@ function summarize(data) {
   const cols = Object.keys(data[0]);
   const summary = cols.map(col => {
     const vals = data.map(r => r[col]);
-    const tipo = detectType(vals);
+    const tipo = detectType(vals, col);
     return `${col}: ${tipo} (muestra ${vals.slice(0, 50).length})`;
   }).join("\n");
   document.getElementById("summary").textContent = `Filas: ${data.length}\nColumnas: ${cols.length}\n${summary}`;
@@ -71,12 +88,12 @@ document.getElementById("renderBtn").addEventListener("click", async () => {
   const yCol = document.getElementById("yColumn").value;
   const chartTypeSel = document.getElementById("chartType").value;
 
-  const data = await loadCSV(csvPath);
+  const [data] = await Promise.all([loadCSV(csvPath), loadProfile(csvPath)]);
   summarize(data);
 
   const xValues = data.map(r => r[xCol]);
-  const xType = detectType(xValues);
-  const yType = yCol ? detectType(data.map(r => r[yCol])) : null;
+  const xType = detectType(xValues, xCol);
+  const yType = yCol ? detectType(data.map(r => r[yCol]), yCol) : null;
 
   let labels = [], values = [], chartType = "bar", title = "";
 
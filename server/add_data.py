@@ -1,259 +1,617 @@
-import pandas as pd
-from sqlmodel import Session, select
+import csv
+import itertools
+import math
+from sqlalchemy import and_, insert, or_, select
+from sqlmodel import Session
 from datetime import datetime, date
 import logging
-from typing import Optional, Dict, Any
-from server.db import engine, init_db
+from typing import Optional, Dict, Any, Callable, Iterable, List, NamedTuple, Tuple
+from server.db import engine, init_db, loader_engine
 from server.models import Case, Insured, Policy, Vehicle, Incident, Claim
+from server.facts import publish_facts, refresh_case_facts
+from server.cache import NATURAL_KEYS, dimension_cache
+from server.changes import record_change, record_changes
+from server.profiling import PROFILE_LOADS, Profiler, is_placeholder, save_profile
+from server.partitions import partition_key, register_keys
 
 # Configure logging
 # logging es para ver que pasa en el codigo
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Filas por transaccion
+BATCH_SIZE = 500
+
+# Llaves naturales por consulta al buscar dimensiones en la base (limite de parametros de SQLite)
+KEY_CHUNK = 100
+
+# on_batch(session, rows_done, stats) -> False para detener la carga
+BatchCallback = Callable[[Session, int, Dict[str, Any]], Optional[bool]]
+
+def is_missing(value: Any) -> bool:
+    """None, NaN (lo que pone pandas en celdas vacias) o un placeholder como "?" """
+    return value is None or (isinstance(value, float) and math.isnan(value)) or is_placeholder(value)
+
 def clean_date(value: Any) -> Optional[date]:
     """Clean date values, handling NaN and empty strings"""
-    if pd.isna(value) or value == "":
+    if is_missing(value) or value == "":
         return None
     return datetime.strptime(str(value), "%Y-%m-%d").date()
 
 # Necesitamos tener proper booleans
 def clean_boolean(value: str) -> bool:
     """Convert YES/NO strings a booleanos"""
-    if pd.isna(value):
+    if is_missing(value):
         return None
     return str(value).upper() == "YES"
 
 # el clasico trim 
 def clean_string(value: Any) -> Optional[str]:
     """Clean string values, handling NaN and empty strings"""
-    if pd.isna(value) or value == "":
+    if is_missing(value) or value == "":
         return None
     return str(value).strip()
 
 def clean_integer(value: Any) -> Optional[int]:
     """Clean integer values, handling NaN and empty strings"""
-    if pd.isna(value) or value == "":
+    if is_missing(value) or value == "":
         return None
     return int(value)
 
 def clean_float(value: Any) -> Optional[float]:
     """Clean float values, handling NaN and empty strings"""
-    if pd.isna(value) or value == "":
+    if is_missing(value) or value == "":
         return None
     return float(value)
 
-def get_or_create_insured(session: Session, row: Dict[str, Any]) -> Insured:
-    """Get or create Insured record based on demographic combination"""
-    # Check for existing insured with similar profile
-    age = int(row.get('age'))
-    sex = clean_string(row.get('insured_sex'))
-    education = clean_string(row.get('insured_education_level'))
-    occupation = clean_string(row.get('insured_occupation'))
-    zip_code = int(row.get('insured_zip'))
-    
-    # Try to find existing insured with matching demographics
-    existing = session.exec(
-        select(Insured).where(
-            Insured.age == age,
-            Insured.sex == sex,
-            Insured.education_level == education,
-            Insured.occupation == occupation,
-            Insured.zip_code == zip_code
-        )
-    ).first()
-    
-    if existing:
-        return existing
-    
-    # Create new insured
-    insured = Insured(
-        age=age,
-        sex=sex,
-        education_level=education,
-        occupation=occupation,
+# -----------------------------
+# Registros de staging: una fila del CSV ya limpia, con los campos en el orden
+# de las columnas de cada modelo. Los usan los get-or-create y el loader liviano.
+# -----------------------------
+class InsuredRecord(NamedTuple):
+    age: int
+    sex: Optional[str]
+    education_level: Optional[str]
+    occupation: Optional[str]
+    hobbies: Optional[str]
+    relationships: Optional[str]
+    zip_code: int
+    months_as_customer: Optional[int]
+    capital_gains: Optional[int]
+    capital_loss: Optional[int]
+
+class PolicyRecord(NamedTuple):
+    policy_number: int
+    bind_date: Optional[date]
+    policy_state: Optional[str]
+    csl: Optional[str]
+    deductible: Optional[int]
+    annual_premium: Optional[float]
+    umbrella_limit: Optional[int]
+
+class VehicleRecord(NamedTuple):
+    make: Optional[str]
+    model: Optional[str]
+    year: Optional[int]
+
+class IncidentRecord(NamedTuple):
+    date: Optional[date]
+    incident_type: Optional[str]
+    collision_type: Optional[str]
+    incident_severity: Optional[str]
+    authorities_contacted: Optional[str]
+    incident_state: Optional[str]
+    incident_city: Optional[str]
+    incident_location: Optional[str]
+    hour_of_day: Optional[int]
+    vehicles_involved: Optional[int]
+    property_damage: Optional[bool]
+    bodily_injuries: Optional[int]
+    witnesses: Optional[int]
+    police_report_available: Optional[bool]
+    partition_key: str
+
+class ClaimRecord(NamedTuple):
+    total_claim_amount: Optional[int]
+    injury_claim: Optional[int]
+    property_claim: Optional[int]
+    vehicle_claim: Optional[int]
+    fraud_reported: Optional[bool]
+    partition_key: Optional[str]
+
+def stage_insured(row: Dict[str, Any]) -> InsuredRecord:
+    return InsuredRecord(
+        age=int(row.get('age')),
+        sex=clean_string(row.get('insured_sex')),
+        education_level=clean_string(row.get('insured_education_level')),
+        occupation=clean_string(row.get('insured_occupation')),
         hobbies=clean_string(row.get('insured_hobbies')),
         relationships=clean_string(row.get('insured_relationship')),
-        zip_code=zip_code,
+        zip_code=int(row.get('insured_zip')),
         months_as_customer=clean_integer(row.get('months_as_customer')),
         capital_gains=clean_integer(row.get('capital-gains')),
         capital_loss=clean_integer(row.get('capital-loss'))
     )
+
+def stage_policy(row: Dict[str, Any]) -> PolicyRecord:
+    return PolicyRecord(
+        policy_number=int(row.get('policy_number')),
+        bind_date=clean_date(row.get('policy_bind_date')),
+        policy_state=clean_string(row.get('policy_state')),
+        csl=clean_string(row.get('policy_csl')),
+        deductible=clean_integer(row.get('policy_deductable')),
+        annual_premium=clean_float(row.get('policy_annual_premium')),
+        umbrella_limit=clean_integer(row.get('umbrella_limit'))
+    )
+
+def stage_vehicle(row: Dict[str, Any]) -> VehicleRecord:
+    return VehicleRecord(
+        make=clean_string(row.get('auto_make')),
+        model=clean_string(row.get('auto_model')),
+        year=clean_integer(row.get('auto_year'))
+    )
+
+def stage_incident(row: Dict[str, Any]) -> IncidentRecord:
+    incident_date = clean_date(row.get('incident_date'))
+    incident_state = clean_string(row.get('incident_state'))
+    return IncidentRecord(
+        date=incident_date,
+        incident_type=clean_string(row.get('incident_type')),
+        collision_type=clean_string(row.get('collision_type')),
+        incident_severity=clean_string(row.get('incident_severity')),
+        authorities_contacted=clean_string(row.get('authorities_contacted')),
+        incident_state=incident_state,
+        incident_city=clean_string(row.get('incident_city')),
+        incident_location=clean_string(row.get('incident_location')),
+        hour_of_day=clean_integer(row.get('incident_hour_of_the_day')),
+        vehicles_involved=clean_integer(row.get('number_of_vehicles_involved')),
+        property_damage=clean_boolean(row.get('property_damage')),
+        bodily_injuries=clean_integer(row.get('bodily_injuries')),
+        witnesses=clean_integer(row.get('witnesses')),
+        police_report_available=clean_boolean(row.get('police_report_available')),
+        # los inserts por lote no disparan el evento de partitions.py
+        partition_key=partition_key(incident_state, incident_date)
+    )
+
+def stage_claim(row: Dict[str, Any], partition: Optional[str] = None) -> ClaimRecord:
+    return ClaimRecord(
+        total_claim_amount=clean_integer(row.get('total_claim_amount')),
+        injury_claim=clean_integer(row.get('injury_claim')),
+        property_claim=clean_integer(row.get('property_claim')),
+        vehicle_claim=clean_integer(row.get('vehicle_claim')),
+        fraud_reported=clean_boolean(row.get('fraud_reported')),
+        partition_key=partition
+    )
+
+class StagedRow:
+    """Una fila del CSV lista para insertar; solo vive mientras dura su lote"""
+    __slots__ = ("insured", "policy", "vehicle", "incident", "claim")
+
+    def __init__(self, row: Dict[str, Any]):
+        self.insured = stage_insured(row)
+        self.policy = stage_policy(row)
+        self.vehicle = stage_vehicle(row)
+        self.incident = stage_incident(row)
+        self.claim = stage_claim(row, self.incident.partition_key)
+
+def natural_key(model: type, record: NamedTuple) -> Tuple[Any, ...]:
+    return tuple(getattr(record, name) for name in NATURAL_KEYS[model])
+
+def lookup_dimensions(session: Session, model: type, keys: List[Tuple[Any, ...]]) -> Dict[Tuple[Any, ...], Dict[str, Any]]:
+    """
+    Busca en la base las llaves naturales que el cache no tiene: otro proceso
+    (un worker, el CLI) pudo crearlas despues de que el cache se cargo. Lo
+    encontrado se agrega al cache. Usa el indice de la llave natural.
+    """
+    table = model.__table__
+    columns = [table.c[name] for name in NATURAL_KEYS[model]]
+    found: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for start in range(0, len(keys), KEY_CHUNK):
+        chunk = keys[start:start + KEY_CHUNK]
+        rows = session.execute(
+            select(table)
+            # col == None se traduce a IS NULL
+            .where(or_(*[and_(*[c == v for c, v in zip(columns, key)]) for key in chunk]))
+            .order_by(table.c.id)
+        ).all()
+        for row in rows:
+            values = dict(row._mapping)
+            key = tuple(values[name] for name in NATURAL_KEYS[model])
+            # ante llaves repetidas gana la primera, igual que en el cache
+            if key not in found:
+                found[key] = values
+                dimension_cache.put_values(model, values)
+    return found
+
+def find_dimension(session: Session, model: type, key: Tuple[Any, ...]) -> Optional[Any]:
+    """Primero el cache y, si no esta, la base"""
+    existing = dimension_cache.find(model, *key)
+    if existing is None:
+        values = lookup_dimensions(session, model, [key]).get(key)
+        existing = model(**values) if values else None
+    return existing
+
+def get_or_create_insured(session: Session, row: Dict[str, Any]) -> Tuple[Insured, bool]:
+    """Get or create Insured record based on demographic combination"""
+    record = stage_insured(row)
+    
+    # Try to find existing insured with matching demographics (cache y, si no esta, la base)
+    existing = find_dimension(session, Insured, natural_key(Insured, record))
+    
+    if existing:
+        return existing, False
+    
+    # Create new insured
+    insured = Insured(**record._asdict())
     
     session.add(insured)
-    session.commit()
-    session.refresh(insured)
-    return insured
+    session.flush()
+    record_change(session, insured, "create")
+    dimension_cache.put(insured)
+    return insured, True
 
-def get_or_create_policy(session: Session, row: Dict[str, Any]) -> Policy:
+def get_or_create_policy(session: Session, row: Dict[str, Any]) -> Tuple[Policy, bool]:
     """Get or create Policy record based on policy_number"""
-    policy_number = int(row.get('policy_number'))
+    record = stage_policy(row)
     
     # Check for existing policy
-    existing = session.exec(
-        select(Policy).where(Policy.policy_number == policy_number)
-    ).first()
+    existing = find_dimension(session, Policy, natural_key(Policy, record))
     
     if existing:
-        return existing
+        return existing, False
     
     # Create new policy
-    policy = Policy(
-        policy_number=policy_number,
-        bind_date=clean_date(row.get('policy_bind_date')),
-        policy_state=clean_string(row.get('policy_state')),
-        csl=clean_string(row.get('policy_csl')),
-        deductible=clean_integer(row.get('policy_deductable')), 
-        annual_premium=clean_float(row.get('policy_annual_premium')),
-        umbrella_limit=clean_integer(row.get('umbrella_limit'))
-    )
+    policy = Policy(**record._asdict())
     
     session.add(policy)
-    session.commit()
-    session.refresh(policy)
-    return policy
+    session.flush()
+    record_change(session, policy, "create")
+    dimension_cache.put(policy)
+    return policy, True
 
-def get_or_create_vehicle(session: Session, row: Dict[str, Any]) -> Vehicle:
+def get_or_create_vehicle(session: Session, row: Dict[str, Any]) -> Tuple[Vehicle, bool]:
     """Get or create Vehicle record based on make + model + year"""
-    make = clean_string(row.get('auto_make'))
-    model = clean_string(row.get('auto_model'))
-    year = clean_integer(row.get('auto_year'))
+    record = stage_vehicle(row)
     
     # Check for existing vehicle
-    existing = session.exec(
-        select(Vehicle).where(
-            Vehicle.make == make,
-            Vehicle.model == model,
-            Vehicle.year == year
-        )
-    ).first()
+    existing = find_dimension(session, Vehicle, natural_key(Vehicle, record))
     
     if existing:
-        return existing
+        return existing, False
     
     # Create new vehicle
-    vehicle = Vehicle(
-        make=make,
-        model=model,
-        year=year
-    )
+    vehicle = Vehicle(**record._asdict())
     
     session.add(vehicle)
-    session.commit()
-    session.refresh(vehicle)
-    return vehicle
+    session.flush()
+    record_change(session, vehicle, "create")
+    dimension_cache.put(vehicle)
+    return vehicle, True
 
 def create_incident(session: Session, row: Dict[str, Any]) -> Incident:
     """Create new Incident record (incidents are unique per case)"""
-    incident = Incident(
-        date=clean_date(row.get('incident_date')),
-        incident_type=clean_string(row.get('incident_type')),
-        collision_type=clean_string(row.get('collision_type')),
-        incident_severity=clean_string(row.get('incident_severity')),
-        authorities_contacted=clean_string(row.get('authorities_contacted')),
-        incident_state=clean_string(row.get('incident_state')),
-        incident_city=clean_string(row.get('incident_city')),
-        incident_location=clean_string(row.get('incident_location')),
-        hour_of_day=clean_integer(row.get('incident_hour_of_the_day')),
-        vehicles_involved=clean_integer(row.get('number_of_vehicles_involved')),
-        property_damage=clean_boolean(row.get('property_damage')),
-        bodily_injuries=clean_integer(row.get('bodily_injuries')),
-        witnesses=clean_integer(row.get('witnesses')),
-        police_report_available=clean_boolean(row.get('police_report_available'))
-    )
+    incident = Incident(**stage_incident(row)._asdict())
     
     session.add(incident)
-    session.commit()
-    session.refresh(incident)
+    session.flush()
+    record_change(session, incident, "create")
     return incident
 
-def create_claim(session: Session, row: Dict[str, Any]) -> Claim:
+def create_claim(session: Session, row: Dict[str, Any], partition: Optional[str] = None) -> Claim:
     """Create new Claim record (claims are unique per case)"""
-    claim = Claim(
-        total_claim_amount=clean_integer(row.get('total_claim_amount')),
-        injury_claim=clean_integer(row.get('injury_claim')),
-        property_claim=clean_integer(row.get('property_claim')),
-        vehicle_claim=clean_integer(row.get('vehicle_claim')),
-        fraud_reported=clean_boolean(row.get('fraud_reported'))
-    )
+    claim = Claim(**stage_claim(row, partition)._asdict())
     
     session.add(claim)
-    session.commit()
-    session.refresh(claim)
+    session.flush()
+    record_change(session, claim, "create")
     return claim
 
-def load_to_database(file_path: str = "data/insurance_claims_clean.csv") -> Dict[str, Any]:
+def new_stats() -> Dict[str, Any]:
+    return {
+        "rows_processed": 0,
+        "insureds_created": 0,
+        "policies_created": 0,
+        "vehicles_created": 0,
+        "incidents_created": 0,
+        "claims_created": 0,
+        "cases_created": 0,
+        "errors": []
+    }
+
+def load_row(session: Session, row: Dict[str, Any], stats: Dict[str, Any],
+             new_dimensions: Optional[List[Tuple[type, int]]] = None) -> Case:
+    """
+    Carga una fila del CSV (sin commit) y devuelve el Case que la une.
+    En new_dimensions anota (modelo, id) de cada dimension que creo.
+    """
+    new_dimensions = [] if new_dimensions is None else new_dimensions
+    # Get or create related entities
+    insured, created = get_or_create_insured(session, row)
+    if created:
+        stats["insureds_created"] += 1
+        new_dimensions.append((Insured, insured.id))
+    
+    policy, created = get_or_create_policy(session, row)
+    if created:
+        stats["policies_created"] += 1
+        new_dimensions.append((Policy, policy.id))
+    
+    vehicle, created = get_or_create_vehicle(session, row)
+    if created:
+        stats["vehicles_created"] += 1
+        new_dimensions.append((Vehicle, vehicle.id))
+    
+    # Create new incident and claim for each case
+    incident = create_incident(session, row)
+    stats["incidents_created"] += 1
+    
+    # el claim va a la misma particion que su incidente
+    claim = create_claim(session, row, incident.partition_key)
+    stats["claims_created"] += 1
+    
+    # Create case linking all entities
+    case = Case(
+        insured_id=insured.id,
+        policy_id=policy.id,
+        vehicle_id=vehicle.id,
+        incident_id=incident.id,
+        claim_id=claim.id
+    )
+    session.add(case)
+    session.flush()
+    record_change(session, case, "create")
+    stats["cases_created"] += 1
+    stats["rows_processed"] += 1
+    return case
+
+def load_rows(
+    session: Session,
+    rows: Iterable[Dict[str, Any]],
+    stats: Dict[str, Any],
+    first_row: int = 1,
+    batch_size: int = BATCH_SIZE,
+    on_batch: Optional[BatchCallback] = None,
+    profiler: Optional[Profiler] = None
+) -> bool:
+    """
+    Carga filas en lotes de `batch_size`; cada lote es una transaccion, asi que
+    tras un corte solo hay que retomar desde el ultimo lote confirmado.
+    Una fila con error se revierte sola (savepoint) y se anota en stats.
+    on_batch(session, rows_done, stats) corre antes de cada commit, dentro de la
+    misma transaccion; si devuelve False la carga se detiene despues de ese lote.
+    Si se pasa un profiler, cada fila cruda se perfila en la misma pasada.
+    Devuelve False si se detuvo por el callback.
+    """
+    case_ids = []
+    rows_done = first_row - 1
+
+    def commit_batch() -> bool:
+        try:
+            facts = refresh_case_facts(session, case_ids)
+            keep_going = on_batch(session, rows_done, stats) if on_batch else True
+            session.commit()
+        except Exception:
+            # lo que el lote metio al cache se revirtio con la transaccion
+            session.rollback()
+            dimension_cache.invalidate()
+            raise
+        # el identity map no tiene que crecer con el archivo
+        session.expunge_all()
+        publish_facts(facts)
+        case_ids.clear()
+        # las dimensiones que otro proceso creo mientras tanto, antes del lote siguiente
+        dimension_cache.sync()
+        return keep_going is not False
+
+    dimension_cache.sync()
+    for row_number, row in enumerate(rows, start=first_row):
+        if profiler is not None:
+            profiler.update(row)
+        counters = {key: value for key, value in stats.items() if key != "errors"}
+        new_dimensions: List[Tuple[type, int]] = []
+        try:
+            logger.debug(f"Processing row {row_number}")
+            with session.begin_nested():
+                case = load_row(session, row, stats, new_dimensions)
+            case_ids.append(case.id)
+        except Exception as e:
+            # lo que la fila alcanzo a crear (y contar, y meter al cache) ya no
+            # existe en la base; solo eso sale del cache
+            stats.update(counters)
+            for model, obj_id in new_dimensions:
+                dimension_cache.evict(model, obj_id)
+            error_msg = f"Error processing row {row_number}: {str(e)}"
+            logger.error(error_msg)
+            stats["errors"].append(error_msg)
+        rows_done = row_number
+        if (rows_done - first_row + 1) % batch_size == 0:
+            logger.info(f"Committed up to row {rows_done}")
+            if not commit_batch():
+                return False
+    return commit_batch()
+
+def _insert_rows(session: Session, model: type, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    INSERT por lotes sin instancias del modelo (no pasa por el identity map).
+    Anota change_log y devuelve las filas con su id, en el mismo orden.
+    """
+    if not rows:
+        return []
+    # sort_by_parameter_order haria un INSERT por fila en SQLite. Sin el, va un
+    # INSERT de varias filas; SQLite asigna los rowid en orden creciente dentro
+    # de la sentencia, asi que los ids ordenados corresponden a las filas en orden
+    # sobre la tabla (Core): el bulk insert del ORM omite las columnas en None
+    # y parte el lote en una sentencia por cada combinacion de nulos
+    table = model.__table__
+    ids = sorted(session.execute(insert(table).returning(table.c.id), rows).scalars().all())
+    created = [{"id": new_id, **row} for new_id, row in zip(ids, rows)]
+    record_changes(session, model.__tablename__, created)
+    return created
+
+def _resolve_dimension(session: Session, model: type, records: List[NamedTuple]) -> Tuple[List[int], int]:
+    """
+    ids de las dimensiones del lote y cuantas se crearon. Las que no estan en
+    el cache se buscan en la base en una pasada y las que tampoco estan ahi se
+    insertan juntas
+    """
+    keys = [natural_key(model, record) for record in records]
+    found: Dict[Tuple[Any, ...], Optional[int]] = {}
+    new: Dict[Tuple[Any, ...], NamedTuple] = {}
+    for key, record in zip(keys, records):
+        if key not in found:
+            found[key] = dimension_cache.find_id(model, *key)
+            if found[key] is None:
+                new[key] = record
+    for key, values in lookup_dimensions(session, model, list(new)).items():
+        found[key] = values["id"]
+        del new[key]
+    created = _insert_rows(session, model, [record._asdict() for record in new.values()])
+    for key, values in zip(new, created):
+        found[key] = values["id"]
+        dimension_cache.put_values(model, values)
+    return [found[key] for key in keys], len(created)
+
+def _insert_batch(session: Session, batch: List[StagedRow], stats: Dict[str, Any]) -> List[int]:
+    """
+    Inserta un lote de filas ya limpias (sin commit), suma lo creado a stats
+    y devuelve los ids de sus Case
+    """
+    insured_ids, created = _resolve_dimension(session, Insured, [staged.insured for staged in batch])
+    stats["insureds_created"] += created
+    policy_ids, created = _resolve_dimension(session, Policy, [staged.policy for staged in batch])
+    stats["policies_created"] += created
+    vehicle_ids, created = _resolve_dimension(session, Vehicle, [staged.vehicle for staged in batch])
+    stats["vehicles_created"] += created
+    incidents = _insert_rows(session, Incident, [staged.incident._asdict() for staged in batch])
+    register_keys(session, (staged.incident.partition_key for staged in batch))
+    claims = _insert_rows(session, Claim, [staged.claim._asdict() for staged in batch])
+    cases = _insert_rows(session, Case, [
+        {
+            "insured_id": insured_id,
+            "policy_id": policy_id,
+            "vehicle_id": vehicle_id,
+            "incident_id": incident["id"],
+            "claim_id": claim["id"],
+        }
+        for insured_id, policy_id, vehicle_id, incident, claim
+        in zip(insured_ids, policy_ids, vehicle_ids, incidents, claims)
+    ])
+    return [case["id"] for case in cases]
+
+def load_rows_lean(
+    session: Session,
+    rows: Iterable[Dict[str, Any]],
+    stats: Dict[str, Any],
+    first_row: int = 1,
+    batch_size: int = BATCH_SIZE,
+    on_batch: Optional[BatchCallback] = None,
+    profiler: Optional[Profiler] = None
+) -> bool:
+    """
+    Mismo contrato que load_rows, con menos memoria por fila: cada fila se
+    limpia a un StagedRow (NamedTuples) y el lote entero se inserta con
+    INSERTs por lotes, sin instancias del modelo ni savepoints por fila.
+    Una fila que no se puede limpiar se anota en stats y el lote sigue; un
+    error de la base revierte el lote completo y se propaga (se retoma desde
+    el ultimo lote confirmado).
+    """
+    batch: List[StagedRow] = []
+    rows_done = first_row - 1
+
+    def commit_batch() -> bool:
+        counters = {key: value for key, value in stats.items() if key != "errors"}
+        # el lote busca sus dimensiones en el cache: primero lo que otro proceso escribio
+        dimension_cache.sync()
+        try:
+            case_ids = _insert_batch(session, batch, stats) if batch else []
+            for key in ("incidents_created", "claims_created", "cases_created", "rows_processed"):
+                stats[key] += len(case_ids)
+            facts = refresh_case_facts(session, case_ids)
+            keep_going = on_batch(session, rows_done, stats) if on_batch else True
+            session.commit()
+        except Exception:
+            # cualquier falla hasta el commit revierte el lote entero: los
+            # contadores vuelven atras y las dimensiones que el lote agrego al
+            # cache ya no existen en la base
+            session.rollback()
+            stats.update(counters)
+            dimension_cache.invalidate()
+            raise
+        session.expunge_all()
+        publish_facts(facts)
+        batch.clear()
+        return keep_going is not False
+
+    for row_number, row in enumerate(rows, start=first_row):
+        if profiler is not None:
+            profiler.update(row)
+        try:
+            batch.append(StagedRow(row))
+        except Exception as e:
+            error_msg = f"Error processing row {row_number}: {str(e)}"
+            logger.error(error_msg)
+            stats["errors"].append(error_msg)
+        rows_done = row_number
+        if (rows_done - first_row + 1) % batch_size == 0:
+            logger.info(f"Committed up to row {rows_done}")
+            if not commit_batch():
+                return False
+    return commit_batch()
+
+def load_to_database(
+    file_path: str = "data/insurance_claims_clean.csv",
+    start_row: int = 0,
+    batch_size: int = BATCH_SIZE,
+    on_batch: Optional[BatchCallback] = None,
+    lean: bool = True,
+    profile: bool = PROFILE_LOADS
+) -> Dict[str, Any]:
     """
     Main function to load CSV data into database
+    start_row: filas de datos a saltar (para retomar una carga cortada)
+    lean: CSV en streaming + load_rows_lean; False usa pandas y el ORM fila por fila
+    profile: guardar el perfil de calidad del archivo (LOAD_PROFILE, apagado por defecto)
     Returns summary of import results
     """
     try:
         # Initialize database
         init_db()
         
-        # Read CSV file
-        logger.info(f"Reading CSV file: {file_path}")
-        df = pd.read_csv(file_path)
-        logger.info(f"Loaded {len(df)} rows from CSV")
-        
         # Initialize counters
-        stats = {
-            "rows_processed": 0,
-            "insureds_created": 0,
-            "policies_created": 0,
-            "vehicles_created": 0,
-            "incidents_created": 0,
-            "claims_created": 0,
-            "cases_created": 0,
-            "errors": []
-        }
+        stats = new_stats()
+        
+        profiler = Profiler() if profile else None
+        logger.info(f"Reading CSV file: {file_path}")
+        # el camino ORM necesita savepoints reales (ver make_savepoint_engine)
+        with Session(engine if lean else loader_engine) as session:
+            if lean:
+                # el archivo se lee a medida que se carga: en memoria solo queda el lote en curso
+                with open(file_path, newline="") as fh:
+                    rows = itertools.islice(csv.DictReader(fh), start_row, None)
+                    completed = load_rows_lean(session, rows, stats, start_row + 1, batch_size, on_batch, profiler)
+            else:
+                # pandas solo hace falta aqui; importarlo arriba lo cargaria tambien en la API
+                import pandas as pd
+                
+                # todo como texto: los clean_* convierten y el perfil ve los valores crudos
+                df = pd.read_csv(file_path, skiprows=range(1, start_row + 1), dtype=str, keep_default_na=False)
+                logger.info(f"Loaded {len(df)} rows from CSV")
+                rows = (row.to_dict() for _, row in df.iterrows())
+                completed = load_rows(session, rows, stats, start_row + 1, batch_size, on_batch, profiler)
+            if profiler is not None:
+                save_profile(session, file_path, profiler)
+            session.commit()
         
-        with Session(engine) as session:
-            for index, row in df.iterrows():
-                try:
-                    logger.info(f"Processing row {index + 1}/{len(df)}")
-                    
-                    # Get or create related entities
-                    insured = get_or_create_insured(session, row.to_dict())
-                    if insured.id is not None:
-                        stats["insureds_created"] += 1
-                    
-                    policy = get_or_create_policy(session, row.to_dict())
-                    if policy.id is not None:
-                        stats["policies_created"] += 1
-                    
-                    vehicle = get_or_create_vehicle(session, row.to_dict())
-                    if vehicle.id is not None:
-                        stats["vehicles_created"] += 1
-                    
-                    # Create new incident and claim for each case
-                    incident = create_incident(session, row.to_dict())
-                    stats["incidents_created"] += 1
-                    
-                    claim = create_claim(session, row.to_dict())
-                    stats["claims_created"] += 1
-                    
-                    # Create case linking all entities
-                    case = Case(
-                        insured_id=insured.id,
-                        policy_id=policy.id,
-                        vehicle_id=vehicle.id,
-                        incident_id=incident.id,
-                        claim_id=claim.id
-                    )
-                    session.add(case)
-                    session.commit()
-                    session.refresh(case)
-                    stats["cases_created"] += 1
-                    stats["rows_processed"] += 1
-                    
-                except Exception as e:
-                    error_msg = f"Error processing row {index + 1}: {str(e)}"
-                    logger.error(error_msg)
-                    stats["errors"].append(error_msg)
-                    continue
+        # los placeholders ("?") se guardaron como NULL; avisar de donde venian
+        if profiler is not None:
+            for name, column in profiler.to_dict()["columns"].items():
+                if column["placeholders"]:
+                    logger.warning(f"Column {name}: {column['placeholders']} placeholder values stored as NULL")
         
-        logger.info("Data loading completed successfully")
+        if completed:
+            logger.info("Data loading completed successfully")
+        else:
+            logger.info("Data loading stopped before the end of the file")
         logger.info(f"Summary: {stats}")
         return stats
         
@@ -267,13 +625,15 @@ if __name__ == "__main__":
     import sys
     
     # Get file path from command line argument or use default
-    file_path = sys.argv[1] if len(sys.argv) > 1 else "data/insurance_claims_clean.csv"
+    # --profile guarda ademas el perfil de calidad del archivo
+    args = [arg for arg in sys.argv[1:] if arg != "--profile"]
+    file_path = args[0] if args else "data/insurance_claims_clean.csv"
     
     print(f"Starting data import from: {file_path}")
     print("=" * 50)
     
     # Run the import
-    result = load_to_database(file_path)
+    result = load_to_database(file_path, profile=PROFILE_LOADS or "--profile" in sys.argv)
     
     print("=" * 50)
     print("IMPORT COMPLETED")
@@ -0,0 +1,427 @@
+"""
+Benchmark reproducible del loader y de la API.
+
+Genera CSVs sinteticos con el esquema de insurance_claims_clean.csv, mide
+load_to_database y los endpoints principales (in-process con TestClient)
+sobre una base SQLite temporal, y escribe los resultados en JSON para poder
+compararlos entre cambios.
+
+Uso:
+    python -m server.benchmark                      # 10k, 100k y 1M filas
+    python -m server.benchmark --sizes 10000 --out bench_results.json
+    python -m server.benchmark --compare bench_baseline.json
+    python -m server.benchmark --sizes --startup     # solo arranque en frio
+    python -m server.benchmark --sizes 100000 --memory  # bytes por fila del loader
+"""
+import argparse
+import csv
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+# Mismo orden de columnas que data/insurance_claims_clean.csv
+COLUMNS = [
+    "months_as_customer", "age", "policy_number", "policy_bind_date", "policy_state",
+    "policy_csl", "policy_deductable", "policy_annual_premium", "umbrella_limit",
+    "insured_zip", "insured_sex", "insured_education_level", "insured_occupation",
+    "insured_hobbies", "insured_relationship", "capital-gains", "capital-loss",
+    "incident_date", "incident_type", "collision_type", "incident_severity",
+    "authorities_contacted", "incident_state", "incident_city", "incident_location",
+    "incident_hour_of_the_day", "number_of_vehicles_involved", "property_damage",
+    "bodily_injuries", "witnesses", "police_report_available", "total_claim_amount",
+    "injury_claim", "property_claim", "vehicle_claim", "auto_make", "auto_model",
+    "auto_year", "fraud_reported",
+]
+
+# Valores tomados del dataset real para que la cardinalidad sea parecida
+POLICY_STATES = ["OH", "IN", "IL"]
+CSLS = ["250/500", "100/300", "500/1000"]
+DEDUCTIBLES = [500, 1000, 2000]
+SEXES = ["MALE", "FEMALE"]
+EDUCATION = ["MD", "PhD", "Associate", "Masters", "High School", "College", "JD"]
+OCCUPATIONS = [
+    "craft-repair", "machine-op-inspct", "sales", "armed-forces", "tech-support",
+    "prof-specialty", "other-service", "priv-house-serv", "exec-managerial",
+    "protective-serv", "transport-moving", "handlers-cleaners", "adm-clerical",
+    "farming-fishing",
+]
+HOBBIES = [
+    "sleeping", "reading", "board-games", "bungie-jumping", "base-jumping", "golf",
+    "camping", "dancing", "skydiving", "movies", "hiking", "yachting", "paintball",
+    "chess", "kayaking", "polo", "basketball", "video-games", "cross-fit", "exercise",
+]
+RELATIONSHIPS = ["husband", "other-relative", "own-child", "unmarried", "wife", "not-in-family"]
+INCIDENT_TYPES = ["Single Vehicle Collision", "Vehicle Theft", "Multi-vehicle Collision", "Parked Car"]
+COLLISION_TYPES = ["Side Collision", "?", "Rear Collision", "Front Collision"]
+SEVERITIES = ["Major Damage", "Minor Damage", "Total Loss", "Trivial Damage"]
+AUTHORITIES = ["Police", "None", "Fire", "Other", "Ambulance"]
+INCIDENT_STATES = ["SC", "VA", "NY", "OH", "WV", "NC", "PA"]
+CITIES = ["Columbus", "Riverwood", "Arlington", "Springfield", "Hillsdale", "Northbend", "Northbrook"]
+STREETS = ["4th Drive", "MLK Hwy", "Francis Lane", "Elm Ave", "Andromedia St", "Oak Ridge", "Pine St"]
+VEHICLES = {
+    "Saab": ["92x", "93", "95"], "Mercedes": ["E400", "C300", "ML350"],
+    "Dodge": ["RAM", "Neon"], "Chevrolet": ["Tahoe", "Malibu", "Silverado"],
+    "Accura": ["RSX", "MDX", "TL"], "Nissan": ["Pathfinder", "Maxima", "Ultima"],
+    "Audi": ["A5", "A3", "A6"], "Toyota": ["Camry", "Corolla", "Highlander"],
+    "Ford": ["F150", "Fusion", "Escape"], "Suburu": ["Legacy", "Forrestor", "Impreza"],
+    "BMW": ["X5", "X6", "M5", "3 Series"], "Jeep": ["Wrangler", "Grand Cherokee"],
+    "Honda": ["Civic", "Accord", "CRV"], "Volkswagen": ["Passat", "Jetta"],
+}
+
+logger = logging.getLogger(__name__)
+
+
+def generate_csv(path: str, rows: int, seed: int = 42) -> str:
+    """Escribe un CSV sintetico de `rows` filas; misma semilla, mismo archivo"""
+    rng = random.Random(seed)
+    makes = list(VEHICLES)
+    # Pools acotados para que los get-or-create encuentren duplicados
+    policy_pool = max(1, rows // 2)
+    zip_pool = max(1, rows // 4)
+    start = date(2015, 1, 1)
+    bind_start = date(1990, 1, 1)
+
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(COLUMNS)
+        for _ in range(rows):
+            make = rng.choice(makes)
+            injury = rng.randrange(0, 20_000, 10)
+            prop = rng.randrange(0, 20_000, 10)
+            vehicle = rng.randrange(0, 80_000, 10)
+            writer.writerow([
+                rng.randint(0, 480),
+                rng.randint(19, 64),
+                100_000 + rng.randrange(policy_pool),
+                (bind_start + timedelta(days=rng.randrange(9_000))).isoformat(),
+                rng.choice(POLICY_STATES),
+                rng.choice(CSLS),
+                rng.choice(DEDUCTIBLES),
+                round(rng.uniform(430, 2050), 2),
+                rng.choice([0, 0, 0, 5_000_000, 6_000_000]),
+                430_000 + rng.randrange(zip_pool),
+                rng.choice(SEXES),
+                rng.choice(EDUCATION),
+                rng.choice(OCCUPATIONS),
+                rng.choice(HOBBIES),
+                rng.choice(RELATIONSHIPS),
+                rng.randrange(0, 100_000, 100),
+                -rng.randrange(0, 100_000, 100),
+                (start + timedelta(days=rng.randrange(60))).isoformat(),
+                rng.choice(INCIDENT_TYPES),
+                rng.choice(COLLISION_TYPES),
+                rng.choice(SEVERITIES),
+                rng.choice(AUTHORITIES),
+                rng.choice(INCIDENT_STATES),
+                rng.choice(CITIES),
+                f"{rng.randint(1000, 9999)} {rng.choice(STREETS)}",
+                rng.randint(0, 23),
+                rng.randint(1, 4),
+                rng.choice(["YES", "NO"]),
+                rng.randint(0, 2),
+                rng.randint(0, 3),
+                rng.choice(["YES", "NO"]),
+                injury + prop + vehicle,
+                injury,
+                prop,
+                vehicle,
+                make,
+                rng.choice(VEHICLES[make]),
+                rng.randint(1995, 2015),
+                "YES" if rng.random() < 0.25 else "NO",
+            ])
+    return path
+
+
+def summarize_timings(samples: List[float]) -> Dict[str, float]:
+    """Resumen en milisegundos de una lista de duraciones en segundos"""
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+    return {
+        "n": len(ms),
+        "min_ms": round(ms[0], 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(p95, 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def time_calls(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize_timings(samples)
+
+
+def bench_loader(csv_path: str, rows: int) -> Dict[str, Any]:
+    from server.add_data import load_to_database
+
+    t0 = time.perf_counter()
+    result = load_to_database(csv_path)
+    elapsed = time.perf_counter() - t0
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return {
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+        "rows_processed": result["rows_processed"],
+        "errors": len(result["errors"]),
+    }
+
+
+def bench_api(rows: int, repeat: int, seed: int) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+    from server.main import app
+
+    rng = random.Random(seed)
+    results: Dict[str, Any] = {}
+
+    with TestClient(app) as client:
+        def get(url: str) -> Callable[[], Any]:
+            def call():
+                r = client.get(url)
+                r.raise_for_status()
+                return r
+            return call
+
+        def get_random(prefix: str) -> Callable[[], Any]:
+            def call():
+                r = client.get(f"{prefix}/{rng.randint(1, rows)}")
+                if r.status_code not in (200, 404):
+                    r.raise_for_status()
+                return r
+            return call
+
+        last_page = max(1, rows // 100)
+        for name in ("insureds", "policies", "vehicles", "incidents", "claims", "cases"):
+            results[f"list_{name}"] = time_calls(get(f"/{name}?per_page=100"), repeat)
+        results["list_cases_last_page"] = time_calls(get(f"/cases?page={last_page}&per_page=100"), repeat)
+        results["list_policies_by_state"] = time_calls(get("/policies?policy_state=OH&per_page=100"), repeat)
+        for name in ("claims", "incidents", "policies"):
+            results[f"get_{name}"] = time_calls(get_random(f"/{name}"), repeat)
+        results["get_case_expanded"] = time_calls(get_random("/cases"), repeat)
+        results["stats"] = time_calls(get("/stats"), repeat)
+    return results
+
+
+def bench_memory(csv_path: str, rows: int) -> Dict[str, Any]:
+    """
+    Pico de memoria (tracemalloc) y colecciones del GC de load_to_database por
+    el camino ORM (pandas + instancias por fila) y por el liviano.
+    """
+    from server.add_data import load_to_database
+
+    results: Dict[str, Any] = {}
+    for mode, lean in (("orm", False), ("lean", True)):
+        reset_database()
+        gc.collect()
+        collections = sum(s["collections"] for s in gc.get_stats())
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        result = load_to_database(csv_path, lean=lean)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        results[mode] = {
+            "peak_bytes": peak,
+            "bytes_per_row": round(peak / rows, 1) if rows else None,
+            "gc_collections": sum(s["collections"] for s in gc.get_stats()) - collections,
+            "seconds": round(elapsed, 3),  # con tracemalloc activo; solo para comparar entre si
+        }
+    results["ratio"] = round(results["lean"]["peak_bytes"] / results["orm"]["peak_bytes"], 3)
+    return results
+
+
+def reset_database() -> None:
+    from sqlalchemy import text
+    from sqlmodel import SQLModel
+    from server.db import engine, init_db
+
+    from server.cache import dimension_cache
+
+    SQLModel.metadata.drop_all(engine)
+    # sin el sello, init_db vuelve a crear todo
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_stamp"))
+    init_db()
+    # los ids cacheados eran de la base anterior
+    dimension_cache.invalidate()
+
+
+# Corre en un interprete nuevo: mide import de server.main, startup y primer request
+STARTUP_PROBE = """
+import json, sys, time
+from fastapi.testclient import TestClient
+t0 = time.perf_counter()
+import server.main
+t1 = time.perf_counter()
+with TestClient(server.main.app) as client:
+    t2 = time.perf_counter()
+    client.get("/health").raise_for_status()
+    t3 = time.perf_counter()
+heavy = [m for m in ("pandas", "numpy") if m in sys.modules]
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "startup_ms": (t2 - t1) * 1000,
+                  "first_request_ms": (t3 - t2) * 1000, "total_ms": (t3 - t0) * 1000,
+                  "heavy_modules_loaded": heavy}))
+"""
+
+
+def _probe(env: Dict[str, str]) -> Dict[str, Any]:
+    out = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(env: Dict[str, str], limit: int = 10) -> List[Dict[str, Any]]:
+    """Los modulos con mayor tiempo acumulado segun python -X importtime"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server.main"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    return sorted(rows, key=lambda r: -r["cumulative_ms"])[:limit]
+
+
+def bench_startup(repeat: int = 5) -> Dict[str, Any]:
+    """Arranque en frio con y sin FAST_STARTUP, sobre la base de DATABASE_URL"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    modes = {"fast": "1", "full": "0"}
+    samples: Dict[str, List[Dict[str, Any]]] = {mode: [] for mode in modes}
+    _probe(env)  # la primera corrida paga el cache de disco; se descarta
+    # intercaladas para que el ruido de la maquina afecte igual a ambos modos
+    for _ in range(repeat):
+        for mode, flag in modes.items():
+            samples[mode].append(_probe({**env, "FAST_STARTUP": flag}))
+    report: Dict[str, Any] = {}
+    for mode in modes:
+        report[mode] = {
+            key: round(statistics.median(s[key] for s in samples[mode]), 2)
+            for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms")
+        }
+        report[mode]["heavy_modules_loaded"] = samples[mode][-1]["heavy_modules_loaded"]
+    env["FAST_STARTUP"] = "1"
+    report["top_imports"] = top_imports(env)
+    return report
+
+
+def run(sizes: List[int], repeat: int, seed: int, workdir: str, startup: bool = False,
+        memory: bool = False) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "sizes": {},
+    }
+    for rows in sizes:
+        logger.info(f"Benchmark con {rows} filas")
+        csv_path = generate_csv(os.path.join(workdir, f"claims_{rows}.csv"), rows, seed)
+        if memory:
+            logger.info(f"Memoria del loader con {rows} filas")
+            report.setdefault("memory", {})[str(rows)] = bench_memory(csv_path, rows)
+        reset_database()
+        report["sizes"][str(rows)] = {
+            "loader": bench_loader(csv_path, rows),
+            "api": bench_api(rows, repeat, seed),
+        }
+        os.remove(csv_path)
+    if startup:
+        logger.info("Benchmark de arranque")
+        report["startup"] = bench_startup()
+    return report
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Lineas legibles con la razon actual/baseline de cada metrica"""
+    lines = []
+    for size, cur in current["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if not base:
+            continue
+        b, c = base["loader"]["seconds"], cur["loader"]["seconds"]
+        lines.append(f"[{size}] loader: {b:.3f}s -> {c:.3f}s (x{c / b:.2f})" if b else f"[{size}] loader: {c:.3f}s")
+        for name, timing in cur["api"].items():
+            prev = base["api"].get(name)
+            if prev and prev["p50_ms"]:
+                ratio = timing["p50_ms"] / prev["p50_ms"]
+                lines.append(f"[{size}] {name}: p50 {prev['p50_ms']:.2f}ms -> {timing['p50_ms']:.2f}ms (x{ratio:.2f})")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del loader y de la API")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=50, help="repeticiones por endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--startup", action="store_true", help="medir tambien import y arranque en frio")
+    parser.add_argument("--memory", action="store_true", help="medir memoria por fila del loader (ORM vs liviano)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # El loader registra cada fila; en un benchmark eso es ruido y costo
+    logging.getLogger("server.add_data").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="claims-bench-") as workdir:
+        # server.db lee DATABASE_URL al importarse, asi que va antes de cualquier import del server
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        # el benchmark dispara cientos de requests desde un solo cliente
+        os.environ.setdefault("RATE_LIMIT_RPS", "0")
+        report = run(args.sizes, args.repeat, args.seed, workdir, args.startup, args.memory)
+        from server.db import engine
+        engine.dispose()
+
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Resultados escritos en {args.out}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        for line in compare(report, baseline):
+            print(line)
+    for size, memory in report.get("memory", {}).items():
+        print(f"[{size}] loader memory: {memory['orm']['bytes_per_row']} -> "
+              f"{memory['lean']['bytes_per_row']} bytes/row (x{memory['ratio']})")
+    if "startup" in report:
+        for mode in ("fast", "full"):
+            timing = report["startup"][mode]
+            print(f"startup[{mode}]: import {timing['import_ms']}ms, startup {timing['startup_ms']}ms, "
+                  f"first request {timing['first_request_ms']}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+Cache en memoria de las tablas de dimension pequenas (Vehicle, Policy, Insured).
+
+Cada tabla se guarda por columnas en arrays compactos (`array` de la stdlib):
+los enteros en 'q', los flotantes en 'd', las fechas como ordinal y los textos
+como codigos 'i' sobre un diccionario de strings internados. Ademas hay un
+indice hash por id y otro por la llave natural que usa el loader en sus
+get-or-create, asi que ninguna de esas busquedas toca la base.
+
+Es read-through: una tabla se carga completa la primera vez que se pide y se
+mantiene con put() desde los endpoints de escritura y el loader. Otro proceso
+(otro worker, add_data.py por CLI) puede escribir sin avisar: sync() compara
+el ultimo rev de change_log con el que vio cada tabla y recarga solo las filas
+que cambiaron. Ademas cada tabla expira a los DIM_CACHE_TTL segundos.
+"""
+import os
+import sys
+import threading
+import time
+from array import array
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Boolean, Date, Float, Integer, func
+from sqlmodel import Session, select
+from server.models import ChangeLog, Insured, Policy, Vehicle
+
+# Llaves naturales (las mismas que usan los get_or_create_* de add_data.py)
+NATURAL_KEYS: Dict[type, Tuple[str, ...]] = {
+    Vehicle: ("make", "model", "year"),
+    Policy: ("policy_number",),
+    Insured: ("age", "sex", "education_level", "occupation", "zip_code"),
+}
+
+TTL_SECONDS = float(os.getenv("DIM_CACHE_TTL", "300"))
+WARM_ON_STARTUP = os.getenv("DIM_CACHE_WARM", "1") != "0"
+# con mas filas cambiadas que esto, sync() recarga la tabla entera
+SYNC_MAX_ROWS = int(os.getenv("DIM_CACHE_SYNC_MAX_ROWS", "1000"))
+# ids por consulta al recargar filas (limite de parametros de SQLite)
+SYNC_CHUNK = 500
+
+_NULL_INT = -(2 ** 63)  # centinela de NULL para columnas 'q'
+_NULL_CODE = -1
+
+
+class _IntColumn:
+    typecode = "q"
+
+    def __init__(self):
+        self.values = array(self.typecode)
+
+    def encode(self, value):
+        return _NULL_INT if value is None else int(value)
+
+    def decode(self, raw):
+        return None if raw == _NULL_INT else raw
+
+    def append(self, value):
+        self.values.append(self.encode(value))
+
+    def set(self, row, value):
+        self.values[row] = self.encode(value)
+
+    def get(self, row):
+        return self.decode(self.values[row])
+
+    def nbytes(self):
+        return self.values.buffer_info()[1] * self.values.itemsize
+
+
+class _BoolColumn(_IntColumn):
+    typecode = "b"
+
+    def encode(self, value):
+        return -1 if value is None else int(bool(value))
+
+    def decode(self, raw):
+        return None if raw == -1 else bool(raw)
+
+
+class _FloatColumn(_IntColumn):
+    typecode = "d"
+
+    def encode(self, value):
+        return float("nan") if value is None else float(value)
+
+    def decode(self, raw):
+        return None if raw != raw else raw  # NaN != NaN
+
+
+class _DateColumn(_IntColumn):
+    typecode = "i"
+
+    def encode(self, value):
+        return 0 if value is None else value.toordinal()
+
+    def decode(self, raw):
+        return None if raw == 0 else date.fromordinal(raw)
+
+
+class _StringColumn(_IntColumn):
+    """Codigos 'i' sobre un diccionario de strings internados"""
+    typecode = "i"
+
+    def __init__(self):
+        super().__init__()
+        self.strings: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value):
+        if value is None:
+            return _NULL_CODE
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            value = sys.intern(str(value))
+            self.strings.append(value)
+            self.codes[value] = code
+        return code
+
+    def decode(self, raw):
+        return None if raw == _NULL_CODE else self.strings[raw]
+
+    def nbytes(self):
+        return (
+            super().nbytes()
+            + sys.getsizeof(self.strings)
+            + sys.getsizeof(self.codes)
+            + sum(sys.getsizeof(s) for s in self.strings)
+        )
+
+
+def _column_for(sa_type) -> _IntColumn:
+    if isinstance(sa_type, Boolean):
+        return _BoolColumn()
+    if isinstance(sa_type, Integer):
+        return _IntColumn()
+    if isinstance(sa_type, Float):
+        return _FloatColumn()
+    if isinstance(sa_type, Date):
+        return _DateColumn()
+    return _StringColumn()
+
+
+class DimensionTable:
+    """Una tabla de dimension en columnas, con indices por id y por llave natural"""
+
+    def __init__(self, model: type, natural_key: Tuple[str, ...]):
+        self.model = model
+        self.natural_key = natural_key
+        self.names = [c.name for c in model.__table__.columns]
+        self.columns = {c.name: _column_for(c.type) for c in model.__table__.columns}
+        self.by_id: Dict[int, int] = {}
+        self.by_key: Dict[Tuple[Any, ...], int] = {}
+        self.rows = 0  # filas en las columnas, incluidas las que evict saco de los indices
+        self.rev = 0  # ultimo rev de change_log ya reflejado en la tabla
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def _key(self, values: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(values.get(name) for name in self.natural_key)
+
+    def put(self, obj: Any) -> None:
+        self.put_values({name: getattr(obj, name) for name in self.names})
+
+    def put_values(self, values: Dict[str, Any]) -> None:
+        row = self.by_id.get(values["id"])
+        if row is None:
+            row = self.rows
+            self.rows += 1
+            for name, column in self.columns.items():
+                column.append(values[name])
+            self.by_id[values["id"]] = row
+        else:
+            old_key = self._key(self.row_values(row))
+            if self.by_key.get(old_key) == row:
+                del self.by_key[old_key]
+            for name, column in self.columns.items():
+                column.set(row, values[name])
+        # ante llaves repetidas gana la primera, igual que el .first() del loader
+        self.by_key.setdefault(self._key(values), row)
+
+    def evict(self, obj_id: int) -> None:
+        # la fila queda en las columnas sin indices; se recupera al recargar
+        row = self.by_id.pop(obj_id, None)
+        if row is not None:
+            key = self._key(self.row_values(row))
+            if self.by_key.get(key) == row:
+                del self.by_key[key]
+
+    def row_values(self, row: int) -> Dict[str, Any]:
+        return {name: column.get(row) for name, column in self.columns.items()}
+
+    def get(self, obj_id: int) -> Optional[Any]:
+        row = self.by_id.get(obj_id)
+        return None if row is None else self.model(**self.row_values(row))
+
+    def find(self, key: Tuple[Any, ...]) -> Optional[Any]:
+        row = self.by_key.get(tuple(key))
+        return None if row is None else self.model(**self.row_values(row))
+
+    def find_id(self, key: Tuple[Any, ...]) -> Optional[int]:
+        row = self.by_key.get(tuple(key))
+        return None if row is None else self.columns["id"].get(row)
+
+    def nbytes(self) -> int:
+        return (
+            sum(column.nbytes() for column in self.columns.values())
+            + sys.getsizeof(self.by_id)
+            + sys.getsizeof(self.by_key)
+            + sum(sys.getsizeof(k) for k in self.by_key)
+        )
+
+
+class DimensionCache:
+    def __init__(self, engine=None, ttl: float = TTL_SECONDS):
+        self.engine = engine
+        self.ttl = ttl
+        self._tables: Dict[type, DimensionTable] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _engine(self):
+        if self.engine is None:
+            from server.db import engine
+            self.engine = engine
+        return self.engine
+
+    def _load(self, model: type) -> DimensionTable:
+        table = DimensionTable(model, NATURAL_KEYS[model])
+        with Session(self._engine()) as session:
+            # el rev se lee antes que las filas: lo que entre en medio se vuelve a aplicar en sync()
+            table.rev = _latest_rev(session)
+            for obj in session.exec(select(model).order_by(model.id)):
+                table.put(obj)
+        return table
+
+    def _sync_table(self, session: Session, model: type, table: DimensionTable, latest: int) -> None:
+        changes = session.exec(
+            select(ChangeLog.entity_id, ChangeLog.op)
+            .where(ChangeLog.rev > table.rev, ChangeLog.rev <= latest, ChangeLog.entity == model.__tablename__)
+        ).all()
+        # un create con un id que ya esta en la tabla lo hizo este proceso (los ids no se repiten)
+        ids = {obj_id for obj_id, op in changes if op != "create" or obj_id not in table.by_id}
+        if len(ids) > SYNC_MAX_ROWS:
+            del self._tables[model]
+            return
+        ids = sorted(ids)
+        for start in range(0, len(ids), SYNC_CHUNK):
+            for obj in session.exec(select(model).where(model.id.in_(ids[start:start + SYNC_CHUNK]))):
+                table.put(obj)
+        table.rev = latest
+
+    def table(self, model: type) -> DimensionTable:
+        with self._lock:
+            table = self._tables.get(model)
+            if table is None or time.monotonic() - table.loaded_at > self.ttl:
+                table = self._tables[model] = self._load(model)
+            return table
+
+    def get(self, model: type, obj_id: Optional[int]) -> Optional[Any]:
+        if obj_id is None:
+            return None
+        with self._lock:
+            obj = self.table(model).get(obj_id)
+            if obj is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return obj
+
+    def find(self, model: type, *key: Any) -> Optional[Any]:
+        with self._lock:
+            obj = self.table(model).find(key)
+            if obj is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return obj
+
+    def find_id(self, model: type, *key: Any) -> Optional[int]:
+        """Como find, pero solo el id: no arma la instancia del modelo"""
+        with self._lock:
+            obj_id = self.table(model).find_id(key)
+            if obj_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return obj_id
+
+    def sync(self) -> None:
+        """
+        Trae lo que otros procesos escribieron en las tablas cargadas desde la
+        ultima vez (segun change_log). Sin cambios cuesta una consulta de max(rev).
+        """
+        with self._lock:
+            if not self._tables:
+                return
+            with Session(self._engine()) as session:
+                latest = _latest_rev(session)
+                for model, table in list(self._tables.items()):
+                    if table.rev < latest:
+                        self._sync_table(session, model, table, latest)
+
+    def put(self, obj: Any) -> None:
+        """Refleja un insert/update ya persistido; si la tabla no esta cargada no hace nada"""
+        with self._lock:
+            table = self._tables.get(type(obj))
+            if table is not None:
+                table.put(obj)
+
+    def put_values(self, model: type, values: Dict[str, Any]) -> None:
+        """put() para filas insertadas sin instancia del modelo (values trae todas las columnas)"""
+        with self._lock:
+            table = self._tables.get(model)
+            if table is not None:
+                table.put_values(values)
+
+    def evict(self, model: type, obj_id: int) -> None:
+        """Saca una fila (por ejemplo, creada en una transaccion que se revirtio)"""
+        with self._lock:
+            table = self._tables.get(model)
+            if table is not None:
+                table.evict(obj_id)
+
+    def invalidate(self, model: Optional[type] = None) -> None:
+        with self._lock:
+            if model is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(model, None)
+
+    def warm(self) -> None:
+        for model in NATURAL_KEYS:
+            self.table(model)
+
+    def warm_in_background(self) -> Optional[threading.Thread]:
+        """Carga las tablas en un hilo para que el arranque no las espere"""
+        if not WARM_ON_STARTUP:
+            return None
+        thread = threading.Thread(target=self.warm, name="dimension-cache-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tables = {
+                model.__tablename__: {"rows": len(table), "bytes": table.nbytes()}
+                for model, table in self._tables.items()
+            }
+            return {
+                "tables": tables,
+                "total_bytes": sum(t["bytes"] for t in tables.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl,
+            }
+
+
+def _latest_rev(session: Session) -> int:
+    return session.exec(select(func.max(ChangeLog.rev))).one() or 0
+
+
+dimension_cache = DimensionCache()
@@ -0,0 +1,61 @@
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List
+from sqlalchemy import insert
+from sqlmodel import Session, select
+from server.models import ChangeLog
+
+MAX_LIMIT = 1000
+
+
+def record_change(session: Session, obj: Any, op: str) -> ChangeLog:
+    """
+    Anota el estado actual de `obj` en change_log (sin commit). Se llama
+    despues del flush para que obj ya tenga id.
+    """
+    change = ChangeLog(
+        entity=obj.__tablename__,
+        entity_id=obj.id,
+        op=op,
+        payload=obj.model_dump(mode="json"),
+    )
+    session.add(change)
+    return change
+
+
+def record_changes(session: Session, entity: str, rows: List[Dict[str, Any]], op: str = "create") -> None:
+    """
+    record_change por lotes para filas insertadas sin ORM (el loader liviano):
+    un solo INSERT, sin commit. Cada fila trae todas las columnas, id incluido.
+    """
+    if not rows:
+        return
+    now = datetime.now(timezone.utc)
+    session.execute(insert(ChangeLog), [
+        {
+            "entity": entity,
+            "entity_id": row["id"],
+            "op": op,
+            # igual que model_dump(mode="json"): fechas como texto ISO
+            "payload": {k: v.isoformat() if isinstance(v, date) else v for k, v in row.items()},
+            "changed_at": now,
+        }
+        for row in rows
+    ])
+
+
+def changes_since(session: Session, since: int = 0, limit: int = 100) -> Dict[str, Any]:
+    """Cambios con rev > since en orden de rev; `next` es el cursor para la siguiente llamada"""
+    limit = max(1, min(limit, MAX_LIMIT))
+    rows: List[ChangeLog] = session.exec(
+        select(ChangeLog)
+        .where(ChangeLog.rev > since)
+        .order_by(ChangeLog.rev)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "changes": rows,
+        "next": rows[-1].rev if rows else since,
+        "has_more": has_more,
+    }
@@ -1,18 +1,165 @@
 from sqlmodel import SQLModel, create_engine, Session # 
 import os # para manejar variables de entorno
+import hashlib
+import itertools
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateTable
 from dotenv import load_dotenv # para cargar variables de entorno desde el .env
 
 load_dotenv()  # Cargar variables de entorno desde el .env
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+
 engine = create_engine(DATABASE_URL)
 
-def init_db():
-    from server.models import Insured, Policy, Vehicle, Incident, Claim, Case
-    SQLModel.metadata.create_all(engine)
+def make_savepoint_engine(url: str):
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        # pysqlite abre la transaccion recien en el primer INSERT/UPDATE, asi que
+        # un SAVEPOINT liberado antes queda commiteado por su cuenta (begin_nested
+        # por fila del loader). Workaround documentado de SQLAlchemy: el driver
+        # no maneja transacciones y el BEGIN lo emite SQLAlchemy. Es IMMEDIATE:
+        # el loader siempre escribe, y con un BEGIN diferido el paso de lectura
+        # a escritura choca con otros escritores (SQLITE_BUSY sin esperar).
+        # Solo para el loader: el resto sigue con el manejo normal del driver
+        @event.listens_for(engine, "connect")
+        def _no_driver_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _emit_begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    return engine
+
+# Sesiones del loader ORM (load_rows, un savepoint por fila)
+loader_engine = make_savepoint_engine(DATABASE_URL)
+
+# Replicas de lectura, separadas por coma. Para probar en local sirve una copia
+# de la base o la misma abierta en solo lectura:
+#   DATABASE_READ_URLS=sqlite:///file:database.db?mode=ro&uri=true
+READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+read_engines = [create_engine(url) for url in READ_URLS] or [engine]
+_next_reader = itertools.cycle(read_engines)
+_reader_lock = threading.Lock()
+
+# Ventana (segundos) en la que un cliente que acaba de escribir lee del primario
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+LAST_WRITE_COOKIE = "last_write"
+
+# Con FAST_STARTUP (default) init_db no toca el esquema si la base ya tiene el
+# sello de esta version de los modelos; FAST_STARTUP=0 fuerza create_all siempre
+FAST_STARTUP = os.getenv("FAST_STARTUP", "1") != "0"
+
+def schema_stamp() -> str:
+    # hash del DDL de todos los modelos: cambia si cambia cualquier tabla o columna
+    ddl = "\n".join(str(CreateTable(table).compile(engine)) for table in SQLModel.metadata.sorted_tables)
+    return hashlib.sha1(ddl.encode()).hexdigest()
+
+def stored_stamp() -> Optional[str]:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT stamp FROM schema_stamp")).scalar()
+    except SQLAlchemyError:
+        return None
+
+def add_missing_columns() -> None:
+    # create_all no toca tablas que ya existen: las columnas nuevas de los
+    # modelos (siempre opcionales) se agregan con ALTER TABLE, y los indices
+    # nuevos se crean aparte
+    existing = inspect(engine)
+    tables = set(existing.get_table_names())
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            present = {c["name"] for c in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = column.type.compile(engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {ddl}'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def init_db() -> bool:
+    """Crea lo que falte del esquema. Devuelve True si tuvo que aplicarlo"""
+    from server.models import Insured, Policy, Vehicle, Incident, Claim, Case, CaseFact, ClaimRollup, PartitionCatalog, ImportJob, ChangeLog, DataProfile
+    stamp = schema_stamp()
+    applied = not (FAST_STARTUP and stored_stamp() == stamp)
+    if applied:
+        SQLModel.metadata.create_all(engine)
+        add_missing_columns()
+    # no solo al aplicar el esquema: otro proceso pudo escribir el sello sin
+    # llenar lo derivado. Sin esquema nuevo primero se mira (solo lectura) si
+    # falta algo, para no abrir una transaccion de escritura en cada arranque
+    if applied or derived_pending():
+        backfill_derived()
+    if applied:
+        # el sello va al final: si el backfill se corta, el proximo arranque lo repite
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE IF NOT EXISTS schema_stamp (stamp VARCHAR NOT NULL)"))
+            conn.execute(text("DELETE FROM schema_stamp"))
+            conn.execute(text("INSERT INTO schema_stamp (stamp) VALUES (:stamp)"), {"stamp": stamp})
+    return applied
+
+def derived_pending() -> bool:
+    """Si falta algo de case_fact, claim_rollup o partition_key. Solo lee"""
+    from server.facts import case_facts_pending
+    from server.partitions import partitions_pending
+    from server.rollups import rollups_pending
+    with Session(engine) as session:
+        return rollups_pending(session) or case_facts_pending(session) or partitions_pending(session)
+
+def backfill_derived() -> None:
+    """Llena case_fact, claim_rollup y partition_key para filas que no los tengan"""
+    from server.facts import backfill_case_facts
+    from server.partitions import backfill_partitions
+    from server.rollups import backfill_rollups
+    with Session(engine) as session:
+        # primero los rollups: si faltan se reconstruyen desde case_fact, y el
+        # backfill de case_fact ya los mantiene por su cuenta
+        backfill_rollups(session)
+        backfill_case_facts(session)
+        backfill_partitions(session)
+
+def on_conflict_insert(bind):
+    """
+    insert() del dialecto con on_conflict_do_update / on_conflict_do_nothing
+    (SQLite y PostgreSQL tienen la misma API). None si el dialecto no lo tiene
+    """
+    if bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+def next_read_engine():
+    with _reader_lock:
+        return next(_next_reader)
 
+def wants_primary(request: Request) -> bool:
+    # read-your-writes: el header lo pide explicito; la cookie la deja el
+    # middleware de main.py despues de cada escritura exitosa
+    if request.headers.get("x-read-your-writes", "").lower() in ("1", "true", "yes"):
+        return True
+    last_write = request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        return last_write is not None and time.time() - float(last_write) < READ_YOUR_WRITES_SECONDS
+    except ValueError:
+        return False
+
+def get_read_session(request: Request):
+    # las lecturas van a las replicas (round-robin) salvo read-your-writes
+    with Session(engine if wants_primary(request) else next_read_engine()) as session:
+        yield session
@@ -0,0 +1,220 @@
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import case as sql_case, delete, insert
+from sqlmodel import Session, select, func
+from server.models import Insured, Policy, Vehicle, Incident, Claim, Case, CaseFact
+from server.changes import record_change
+from server.rollups import apply_fact_delta
+
+# SQLite limita el numero de parametros por sentencia; refrescamos por bloques
+CHUNK_SIZE = 500
+
+# Columna de Case que apunta a cada dimension
+DIMENSION_FK = {
+    Insured: Case.insured_id,
+    Policy: Case.policy_id,
+    Vehicle: Case.vehicle_id,
+    Incident: Case.incident_id,
+    Claim: Case.claim_id,
+}
+
+# Columnas de case_fact por las que se permite agrupar en /analytics
+GROUPABLE = {
+    "insured_sex", "insured_education_level", "insured_occupation",
+    "policy_state", "policy_csl", "policy_deductible", "coverage_level",
+    "vehicle_make", "vehicle_model", "vehicle_year",
+    "incident_type", "collision_type", "incident_severity", "incident_state",
+    "incident_city", "hour_of_day", "witnesses", "police_report_available",
+    "is_night",
+}
+
+
+def _coverage_level(policy: Optional[Policy]) -> Optional[str]:
+    if policy is None or not policy.csl:
+        return None
+    try:
+        return policy.coverageLevel()
+    except (ValueError, IndexError):
+        return None
+
+
+def build_fact(case: Case, insured: Optional[Insured], policy: Optional[Policy],
+               vehicle: Optional[Vehicle], incident: Optional[Incident],
+               claim: Optional[Claim]) -> Dict[str, Any]:
+    """Arma la fila desnormalizada de un Case con sus metricas derivadas"""
+    fact = {
+        "case_id": case.id,
+        "insured_id": case.insured_id,
+        "policy_id": case.policy_id,
+        "vehicle_id": case.vehicle_id,
+        "incident_id": case.incident_id,
+        "claim_id": case.claim_id,
+        "insured_age": insured.age if insured else None,
+        "insured_sex": insured.sex if insured else None,
+        "insured_education_level": insured.education_level if insured else None,
+        "insured_occupation": insured.occupation if insured else None,
+        "insured_zip": insured.zip_code if insured else None,
+        "policy_number": policy.policy_number if policy else None,
+        "policy_state": policy.policy_state if policy else None,
+        "policy_csl": policy.csl if policy else None,
+        "policy_deductible": policy.deductible if policy else None,
+        "policy_annual_premium": policy.annual_premium if policy else None,
+        "coverage_level": _coverage_level(policy),
+        "vehicle_make": vehicle.make if vehicle else None,
+        "vehicle_model": vehicle.model if vehicle else None,
+        "vehicle_year": vehicle.year if vehicle else None,
+        "incident_date": incident.date if incident else None,
+        "incident_type": incident.incident_type if incident else None,
+        "collision_type": incident.collision_type if incident else None,
+        "incident_severity": incident.incident_severity if incident else None,
+        "incident_state": incident.incident_state if incident else None,
+        "incident_city": incident.incident_city if incident else None,
+        "hour_of_day": incident.hour_of_day if incident else None,
+        "witnesses": incident.witnesses if incident else None,
+        "police_report_available": incident.police_report_available if incident else None,
+        "total_claim_amount": claim.total_claim_amount if claim else None,
+        "injury_claim": claim.injury_claim if claim else None,
+        "property_claim": claim.property_claim if claim else None,
+        "vehicle_claim": claim.vehicle_claim if claim else None,
+        "fraud_reported": claim.fraud_reported if claim else None,
+    }
+
+    amount, premium = fact["total_claim_amount"], fact["policy_annual_premium"]
+    fact["loss_ratio"] = amount / premium if amount is not None and premium else None
+
+    bind_date = policy.bind_date if policy else None
+    incident_date = fact["incident_date"]
+    fact["bind_to_incident_days"] = (
+        (incident_date - bind_date).days if incident_date and bind_date else None
+    )
+
+    hour = fact["hour_of_day"]
+    fact["is_night"] = (hour >= 22 or hour <= 5) if hour is not None else None
+    return fact
+
+
+def refresh_case_facts(session: Session, case_ids: Iterable[int]) -> List[Dict[str, Any]]:
+    """
+    Recalcula las filas de case_fact de los Case indicados y ajusta los
+    rollups diarios (sin commit). Los Case que ya no existen simplemente se
+    borran de case_fact. Tambien alinea la partition_key de cada Claim con la
+    de su Incident (y lo anota en change_log). Devuelve las filas nuevas.
+    """
+    ids = sorted({i for i in case_ids if i is not None})
+    facts: List[Dict[str, Any]] = []
+    old_facts: List[Dict[str, Any]] = []
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        rows = session.exec(
+            select(Case, Insured, Policy, Vehicle, Incident, Claim)
+            .outerjoin(Insured, Case.insured_id == Insured.id)
+            .outerjoin(Policy, Case.policy_id == Policy.id)
+            .outerjoin(Vehicle, Case.vehicle_id == Vehicle.id)
+            .outerjoin(Incident, Case.incident_id == Incident.id)
+            .outerjoin(Claim, Case.claim_id == Claim.id)
+            .where(Case.id.in_(chunk))
+        ).all()
+        chunk_facts = [build_fact(*row) for row in rows]
+        for _, _, _, _, incident, claim in rows:
+            # el claim vive en la particion de su incidente
+            if incident is not None and claim is not None and claim.partition_key != incident.partition_key:
+                claim.partition_key = incident.partition_key
+                # tambien es un cambio del claim para el feed de /changes
+                record_change(session, claim, "update")
+        old_facts.extend(
+            fact.model_dump()
+            for fact in session.exec(select(CaseFact).where(CaseFact.case_id.in_(chunk))).all()
+        )
+
+        session.execute(delete(CaseFact).where(CaseFact.case_id.in_(chunk)))
+        if chunk_facts:
+            session.execute(insert(CaseFact), chunk_facts)
+        facts.extend(chunk_facts)
+    # los rollups por fecha se mantienen con la diferencia viejo -> nuevo, una
+    # sola escritura por llamada
+    apply_fact_delta(session, old_facts, facts)
+    return facts
+
+
+def publish_facts(facts: List[Dict[str, Any]]) -> None:
+    """
+    Avisa a los indices en memoria de filas de case_fact ya confirmadas.
+    El indice de similitud (NumPy) solo existe si su modulo ya se cargo en
+    este proceso (al arrancar la API o al primer pedido); si no, no hay nada
+    que actualizar y no vale la pena importarlo.
+    """
+    similarity = sys.modules.get("server.similarity")
+    # mientras el hilo de arranque todavia lo importa, el modulo esta a medias;
+    # el build() que viene despues ya lee estas filas confirmadas
+    index = getattr(similarity, "similarity_index", None)
+    if index is not None and facts:
+        index.update(facts)
+
+
+def case_ids_for(session: Session, obj: Any) -> List[int]:
+    """Ids de los Case afectados por un cambio en `obj` (un Case o una dimension)"""
+    if isinstance(obj, Case):
+        return [obj.id]
+    column = DIMENSION_FK.get(type(obj))
+    if column is None or obj.id is None:
+        return []
+    return list(session.exec(select(Case.id).where(column == obj.id)).all())
+
+
+def refresh_facts_for(session: Session, obj: Any) -> List[Dict[str, Any]]:
+    """Refresca case_fact para todos los Case que dependen de `obj` (sin commit)"""
+    return refresh_case_facts(session, case_ids_for(session, obj))
+
+
+def case_facts_pending(session: Session) -> bool:
+    """Si hay Case sin fila en case_fact. Solo lee (conteos sobre los indices)"""
+    cases = session.exec(select(func.count(Case.id))).one()
+    return cases != session.exec(select(func.count(CaseFact.case_id))).one()
+
+
+def backfill_case_facts(session: Session) -> int:
+    """
+    Llena case_fact para los Case que todavia no tienen fila (por ejemplo,
+    una base creada antes de que existiera la tabla). Hace commit.
+    """
+    if not case_facts_pending(session):
+        return 0
+    missing = session.exec(
+        select(Case.id)
+        .outerjoin(CaseFact, CaseFact.case_id == Case.id)
+        .where(CaseFact.case_id == None)  # noqa: E711
+    ).all()
+    if missing:
+        refresh_case_facts(session, missing)
+        session.commit()
+    return len(missing)
+
+
+def breakdown(session: Session, by: str) -> List[Dict[str, Any]]:
+    """Conteo, tasa de fraude y montos agrupados por una columna de case_fact"""
+    column = getattr(CaseFact, by)
+    fraud = func.sum(sql_case((CaseFact.fraud_reported == True, 1), else_=0))  # noqa: E712
+    rows = session.exec(
+        select(
+            column,
+            func.count(CaseFact.case_id),
+            fraud,
+            func.avg(CaseFact.total_claim_amount),
+            func.coalesce(func.sum(CaseFact.total_claim_amount), 0),
+            func.avg(CaseFact.loss_ratio),
+        )
+        .group_by(column)
+        .order_by(column)
+    ).all()
+    return [
+        {
+            by: value,
+            "cases": cases,
+            "fraud_cases": fraud_cases or 0,
+            "fraud_rate": (fraud_cases or 0) / cases if cases else 0.0,
+            "avg_claim_amount": avg_amount,
+            "total_claim_amount": total_amount,
+            "avg_loss_ratio": avg_loss_ratio,
+        }
+        for value, cases, fraud_cases, avg_amount, total_amount, avg_loss_ratio in rows
+    ]
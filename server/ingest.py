@@ -0,0 +1,207 @@
+"""
+Ingesta de CSV por streaming (POST /ingest/csv).
+
+El cuerpo se parsea a medida que llega: solo se guarda en memoria la linea
+incompleta del ultimo chunk y el lote en curso. Cada lote pasa por el mismo
+camino que add_data.py (load_rows_lean: dimensiones, Case, case_fact) y se confirma en su
+propia transaccion.
+"""
+import codecs
+import csv
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from server.db import engine
+from server.add_data import BATCH_SIZE, load_rows_lean, new_stats
+from server.profiling import PROFILE_LOADS, Profiler, save_profile
+
+logger = logging.getLogger(__name__)
+
+# Sin estas columnas los get-or-create no pueden armar la llave natural
+REQUIRED_COLUMNS = ("age", "policy_number", "insured_zip")
+
+# Tope de un registro (o de una linea sin terminar): una comilla sin cerrar no
+# puede dejar el resto de la subida acumulado en memoria
+MAX_RECORD_CHARS = int(os.getenv("INGEST_MAX_RECORD_CHARS", str(1024 * 1024)))
+
+
+class CsvFormatError(ValueError):
+    pass
+
+
+class IngestError(Exception):
+    """La ingesta se corto; result trae los lotes ya confirmados y sus contadores"""
+
+    def __init__(self, message: str, status_code: int, result: Dict[str, Any]):
+        super().__init__(message)
+        self.status_code = status_code
+        self.result = result
+
+
+class CsvStreamParser:
+    """Convierte chunks de bytes en filas (dict) sin juntar todo el archivo"""
+
+    def __init__(self, encoding: str = "utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._partial = ""   # linea sin terminar del ultimo chunk
+        self._record = []    # lineas de un registro con un campo entre comillas abierto
+        self._record_chars = 0
+        self._record_quotes = 0
+        self._lines = 0
+        self.header: Optional[List[str]] = None
+        # registro demasiado largo: se devuelven las filas anteriores y se corta
+        self.error: Optional[CsvFormatError] = None
+
+    def _too_long(self) -> CsvFormatError:
+        return CsvFormatError(
+            f"Record starting at line {self._lines - len(self._record) + 1} is longer than "
+            f"{MAX_RECORD_CHARS} characters (unbalanced quote?)"
+        )
+
+    def _records(self, text: str, final: bool) -> List[str]:
+        lines = (self._partial + text).split("\n")
+        self._partial = "" if final else lines.pop()
+        records = []
+        for line in lines:
+            self._lines += 1
+            self._record.append(line)
+            self._record_chars += len(line) + 1
+            self._record_quotes += line.count('"')
+            if self._record_chars > MAX_RECORD_CHARS:
+                self.error = self._too_long()
+                return records
+            # un numero impar de comillas = el campo sigue en la siguiente linea
+            if self._record_quotes % 2 == 0 or final:
+                records.append("\n".join(self._record))
+                self._record = []
+                self._record_chars = 0
+                self._record_quotes = 0
+        if self._record_chars + len(self._partial) > MAX_RECORD_CHARS:
+            self.error = self._too_long()
+        return records
+
+    def _rows(self, records: List[str]) -> List[Dict[str, Any]]:
+        rows = []
+        try:
+            parsed = list(csv.reader(r for r in records if r.strip()))
+        except csv.Error as e:
+            raise CsvFormatError(f"Invalid CSV near line {self._lines}: {e}")
+        for values in parsed:
+            if self.header is None:
+                self.header = [v.strip() for v in values]
+                missing = [c for c in REQUIRED_COLUMNS if c not in self.header]
+                if missing:
+                    raise CsvFormatError(f"Missing columns: {', '.join(missing)}")
+                continue
+            rows.append(dict(zip(self.header, values)))
+        return rows
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        if self.error is not None:
+            raise self.error
+        return self._rows(self._records(self._decoder.decode(chunk), final=False))
+
+    def close(self) -> List[Dict[str, Any]]:
+        if self.error is not None:
+            raise self.error
+        return self._rows(self._records(self._decoder.decode(b"", final=True), final=True))
+
+
+def _load_batch(rows: List[Dict[str, Any]], first_row: int, stats: Dict[str, Any], profiler: Optional[Profiler]) -> None:
+    with Session(engine) as session:
+        load_rows_lean(session, rows, stats, first_row=first_row, batch_size=len(rows), profiler=profiler)
+
+
+def _save_profile(profiler: Profiler) -> int:
+    with Session(engine) as session:
+        profile = save_profile(session, "ingest", profiler)
+        session.commit()
+        return profile.id
+
+
+async def ingest_stream(
+    chunks: AsyncIterator[bytes], batch_size: int = BATCH_SIZE, profile: bool = PROFILE_LOADS
+) -> Dict[str, Any]:
+    """
+    Carga un CSV que llega en chunks. Devuelve el avance por lote y el resumen
+    final con los mismos contadores que load_to_database. Si se corta (CSV
+    invalido o error de base) lanza IngestError con lo que ya quedo confirmado.
+    Con profile guarda el perfil de calidad (profile_id en el resumen).
+    """
+    parser = CsvStreamParser()
+    profiler = Profiler() if profile else None
+    stats = new_stats()
+    batches: List[Dict[str, Any]] = []
+    pending: List[Dict[str, Any]] = []
+    next_row = 1
+    t0 = time.perf_counter()
+
+    async def flush() -> None:
+        nonlocal next_row, pending
+        if not pending:
+            return
+        rows, pending = pending, []
+        errors_before = len(stats["errors"])
+        batch_t0 = time.perf_counter()
+        # la carga es sincronica; en el threadpool no frena al event loop
+        await run_in_threadpool(_load_batch, rows, next_row, stats, profiler)
+        elapsed = time.perf_counter() - batch_t0
+        batches.append({
+            "batch": len(batches) + 1,
+            "first_row": next_row,
+            "last_row": next_row + len(rows) - 1,
+            "rows": len(rows),
+            "errors": len(stats["errors"]) - errors_before,
+            "seconds": round(elapsed, 3),
+        })
+        logger.info(f"Ingested rows {next_row}-{next_row + len(rows) - 1}")
+        next_row += len(rows)
+
+    def summary(profile_id: Optional[int] = None) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - t0
+        return {
+            "batches": batches,
+            "stats": stats,
+            "profile_id": profile_id,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(stats["rows_processed"] / elapsed, 1) if elapsed else None,
+        }
+
+    async def flush_all() -> None:
+        nonlocal pending
+        while pending:
+            overflow = pending[batch_size:]
+            pending = pending[:batch_size]
+            await flush()
+            pending = overflow
+
+    try:
+        async for chunk in chunks:
+            pending.extend(parser.feed(chunk))
+            if parser.error is not None:
+                # las filas anteriores al registro roto si se cargan
+                await flush_all()
+                raise parser.error
+            while len(pending) >= batch_size:
+                overflow = pending[batch_size:]
+                pending = pending[:batch_size]
+                await flush()
+                pending = overflow
+        pending.extend(parser.close())
+        await flush_all()
+        if parser.header is None:
+            raise CsvFormatError("Empty CSV")
+    except CsvFormatError as e:
+        raise IngestError(str(e), 400, summary())
+    except Exception as e:
+        # el lote que fallo se revirtio entero; los anteriores ya estan confirmados
+        logger.exception(f"Ingest stopped at row {next_row}")
+        raise IngestError(f"Ingest stopped at row {next_row}: {e}", 500, summary())
+
+    if profiler is None:
+        return summary()
+    profile_id = await run_in_threadpool(_save_profile, profiler)
+    return summary(profile_id)
@@ -0,0 +1,245 @@
+"""
+Cola de jobs en proceso para cargas largas de CSV.
+
+Los jobs se guardan en la tabla import_job y corren en un pool acotado de
+procesos (JOB_WORKERS), asi que una carga grande no bloquea a la API. El
+worker registra el avance en la misma transaccion que cada lote, por eso
+rows_done siempre apunta al ultimo lote confirmado y un resume retoma desde
+ahi sin duplicar filas.
+
+Cada job activo anota en `worker` el proceso a cargo: la API que lo encolo y,
+al arrancar, el worker que lo corre. Al iniciar, la API solo marca como
+interrupted los jobs cuyo proceso ya no existe; los de otra instancia viva
+siguen su curso.
+"""
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from sqlmodel import Session, select
+from server.models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", os.path.join("data", "uploads"))
+# Un job por "path" solo puede leer archivos de estos directorios (y de UPLOAD_DIR)
+IMPORT_DIRS = [d.strip() for d in os.getenv("JOB_IMPORT_DIRS", "data").split(",") if d.strip()]
+
+ACTIVE = ("queued", "running", "cancelling")
+RESUMABLE = ("cancelled", "failed", "interrupted")
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: el worker arranca limpio, sin heredar conexiones del proceso de la API
+        _executor = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def process_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def process_alive(worker: Optional[str]) -> bool:
+    """Si el proceso "host:pid" sigue vivo. De otro host no se puede saber: se asume que si"""
+    if not worker:
+        return False
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    if int(pid) == os.getpid():
+        # pid reciclado por este mismo proceso tras un reinicio
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def mark_failed(job_id: int, error: str) -> None:
+    """Cierra como failed un job cuyo worker ya no puede terminarlo"""
+    from server.db import engine
+
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        if job is None or job.status not in ACTIVE:
+            return
+        job.status = "failed"
+        job.error = error
+        job.finished_at = datetime.now(timezone.utc)
+        session.add(job)
+        session.commit()
+    logger.error(f"Import job {job_id} failed: {error}")
+
+
+def count_rows(path: str) -> int:
+    """Filas de datos del CSV (sin el encabezado)"""
+    with open(path, "rb") as fh:
+        return max(0, sum(1 for _ in fh) - 1)
+
+
+def resolve_import_path(path: str) -> Optional[str]:
+    """Ruta real del CSV si cae dentro de UPLOAD_DIR o de IMPORT_DIRS; si no, None"""
+    real = os.path.realpath(path)
+    for directory in [UPLOAD_DIR, *IMPORT_DIRS]:
+        root = os.path.realpath(directory)
+        if os.path.commonpath([real, root]) == root:
+            return real
+    return None
+
+
+def merge_stats(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Acumula los contadores de corridas anteriores del mismo job"""
+    if not previous:
+        return dict(current)
+    merged = dict(previous)
+    for key, value in current.items():
+        if key == "errors":
+            merged["errors"] = list(previous.get("errors", [])) + list(value)
+        else:
+            merged[key] = previous.get(key, 0) + value
+    return merged
+
+
+def run_import_job(job_id: int) -> str:
+    """Punto de entrada del worker: carga el CSV del job desde su ultimo lote confirmado"""
+    from server.add_data import load_to_database
+    from server.db import engine
+
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        if job is None:
+            return "missing"
+        if job.status != "queued":
+            # cancelado antes de arrancar
+            return job.status
+        job.status = "running"
+        job.worker = process_id()
+        job.started_at = job.started_at or datetime.now(timezone.utc)
+        job.error = None
+        if job.rows_total is None:
+            job.rows_total = count_rows(job.source_path)
+        session.add(job)
+        session.commit()
+        source_path = job.source_path
+        start_row = job.rows_done
+        previous_stats = job.stats
+        batch_size = job.batch_size
+
+    t0 = time.perf_counter()
+
+    def on_batch(session: Session, rows_done: int, stats: Dict[str, Any]) -> bool:
+        # corre dentro de la transaccion del lote: avance y datos se confirman juntos
+        job = session.get(ImportJob, job_id)
+        session.refresh(job)
+        job.rows_done = rows_done
+        elapsed = time.perf_counter() - t0
+        job.rows_per_sec = round((rows_done - start_row) / elapsed, 1) if elapsed else None
+        job.stats = merge_stats(previous_stats, stats)
+        session.add(job)
+        return job.status != "cancelling"
+
+    result = load_to_database(source_path, start_row=start_row, batch_size=batch_size, on_batch=on_batch)
+
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        if "error" in result:
+            job.status = "failed"
+            job.error = result["error"]
+        elif job.status == "cancelling" and job.rows_done < (job.rows_total or 0):
+            job.status = "cancelled"
+        else:
+            job.status = "completed"
+        job.finished_at = datetime.now(timezone.utc)
+        session.add(job)
+        session.commit()
+        logger.info(f"Import job {job_id} {job.status} at row {job.rows_done}")
+        return job.status
+
+
+def _watch(job_id: int, future: Future) -> None:
+    # si el worker murio (p. ej. OOM) el job no llega a cerrarse solo
+    error = future.exception() if not future.cancelled() else None
+    if isinstance(error, BrokenProcessPool):
+        mark_failed(job_id, f"Worker process died: {error}")
+
+
+def submit(session: Session, job: ImportJob) -> ImportJob:
+    """Marca el job como en cola y lo manda al pool"""
+    job.status = "queued"
+    job.worker = process_id()
+    job.error = None
+    job.finished_at = None
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    try:
+        try:
+            future = get_executor().submit(run_import_job, job.id)
+        except BrokenProcessPool:
+            # un worker murio y el pool ya no acepta trabajo: se arma uno nuevo
+            logger.warning("Job process pool is broken; starting a new one")
+            shutdown_executor()
+            future = get_executor().submit(run_import_job, job.id)
+    except Exception as e:
+        mark_failed(job.id, f"Could not start the job: {e}")
+        session.refresh(job)
+        return job
+    future.add_done_callback(lambda done: _watch(job.id, done))
+    return job
+
+
+def cancel(session: Session, job: ImportJob) -> ImportJob:
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.now(timezone.utc)
+    elif job.status == "running":
+        # el worker lo ve al cerrar el lote en curso
+        job.status = "cancelling"
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def recover_interrupted(session: Session) -> int:
+    """Al arrancar: marca los jobs activos cuyo proceso ya no existe"""
+    jobs = [
+        job for job in session.exec(select(ImportJob).where(ImportJob.status.in_(ACTIVE))).all()
+        if not process_alive(job.worker)
+    ]
+    for job in jobs:
+        job.status = "interrupted"
+        session.add(job)
+    session.commit()
+    return len(jobs)
+
+
+def job_view(job: ImportJob) -> Dict[str, Any]:
+    data = job.model_dump()
+    data["progress"] = (
+        round(job.rows_done / job.rows_total, 4) if job.rows_total else None
+    )
+    return data
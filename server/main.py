@@ -1,13 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Form, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlmodel import select, Session, func
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
+import os
+import shutil
+import threading
+import time
+import uuid
 from datetime import date
-from .db import init_db, get_session
+import datetime as dt
+from .db import init_db, get_session, get_read_session, engine, wants_primary, LAST_WRITE_COOKIE
+from . import snapshots
 from .models import (
-    Insured, Policy, Vehicle, Incident, Claim, Case
+    Insured, Policy, Vehicle, Incident, Claim, Case, CaseFact, ImportJob
 )
+from .facts import GROUPABLE, breakdown, publish_facts, refresh_facts_for
+from .rollups import INTERVALS, timeseries
+from .cache import dimension_cache
+from . import jobs
+from .ingest import IngestError, ingest_stream
+from .changes import changes_since, record_change
+from .profiling import PROFILE_LOADS, latest_profile
+from .throttle import RateLimitMiddleware, SingleFlightMiddleware
+from .partitions import catalog, prune
 
 # Pydantic schemas for request/response
 class Page(BaseModel):
@@ -72,7 +89,7 @@ class VehicleUpdate(BaseModel):
 
 # Incident schemas
 class IncidentCreate(BaseModel):
-    date: Optional[date] = None
+    date: Optional[dt.date] = None  # el campo se llama igual que el tipo
     incident_type: Optional[str] = None
     collision_type: Optional[str] = None
     incident_severity: Optional[str] = None
@@ -88,7 +105,7 @@ class IncidentCreate(BaseModel):
     police_report_available: Optional[bool] = None
 
 class IncidentUpdate(BaseModel):
-    date: Optional[date] = None
+    date: Optional[dt.date] = None  # el campo se llama igual que el tipo
     incident_type: Optional[str] = None
     collision_type: Optional[str] = None
     incident_severity: Optional[str] = None
@@ -149,6 +166,29 @@ class CaseResponse(BaseModel):  # ← Heredar de BaseModel, no de Case
 
 app = FastAPI(title="Insurance Management API", version="1.0.0")
 
+class MarkWritesMiddleware:
+    # despues de una escritura exitosa el cliente lee del primario por un rato
+    # (read-your-writes); ver get_read_session en db.py
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def mark(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{LAST_WRITE_COOKIE}={time.time()}; HttpOnly; Path=/; SameSite=lax"
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, mark)
+
+# el ultimo agregado queda por fuera: CORS -> rate limit -> single-flight -> marca de escrituras -> rutas
+app.add_middleware(MarkWritesMiddleware)
+app.add_middleware(SingleFlightMiddleware)
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -162,9 +202,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Armar el indice de similares en segundo plano al arrancar (0 = al primer pedido)
+SIMILARITY_WARM = os.getenv("SIMILARITY_WARM", "1") != "0"
+
+def warm_similarity_index():
+    # en un hilo: ni el import de NumPy ni la lectura de case_fact frenan el arranque
+    from .similarity import similarity_index
+    similarity_index.build_in_background()
+
 @app.on_event("startup")
 def on_startup():
+    # init_db tambien completa case_fact, rollups y particiones que falten
     init_db()
+    with Session(engine) as session:
+        jobs.recover_interrupted(session)
+    snapshots.start()
+    dimension_cache.warm_in_background()
+    if SIMILARITY_WARM:
+        threading.Thread(target=warm_similarity_index, name="similarity-warm", daemon=True).start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    jobs.shutdown_executor()
+    snapshots.stop()
 
 @app.get("/health")
 def health() -> Dict[str, str]:
@@ -179,9 +239,37 @@ def clamp_per_page(per_page: int) -> int:
     if per_page > 100: return 100
     return per_page
 
+def save(session: Session, obj, created: bool = False):
+    # guarda obj, deja case_fact al dia y lo anota en change_log, todo en la
+    # misma transaccion; una dimension recien creada no tiene Cases que refrescar
+    session.add(obj)
+    session.flush()
+    facts = []
+    if not created or isinstance(obj, Case):
+        facts = refresh_facts_for(session, obj)
+    record_change(session, obj, "create" if created else "update")
+    session.commit()
+    session.refresh(obj)
+    dimension_cache.put(obj)
+    publish_facts(facts)
+    return obj
+
+def get_dimension(request: Request, session: Session, model, obj_id: Optional[int]):
+    # el cache es de este proceso: tras una escritura (read-your-writes) puede
+    # no tener lo que otro worker acaba de guardar, asi que se lee de la base
+    if obj_id is None:
+        return None
+    if wants_primary(request):
+        return session.get(model, obj_id)
+    # lo que otros workers cambiaron desde la ultima vez, una vez por request
+    if not getattr(request.state, "dimensions_synced", False):
+        dimension_cache.sync()
+        request.state.dimensions_synced = True
+    return dimension_cache.get(model, obj_id) or session.get(model, obj_id)
+
 # Insured endpoints
 @app.get("/insureds")
-def list_insureds(page: int = 1, per_page: int = 10, session: Session = Depends(get_session)):
+def list_insureds(page: int = 1, per_page: int = 10, session: Session = Depends(get_read_session)):
     page, per_page = clamp_page(page), clamp_per_page(per_page)
     total = session.exec(select(func.count(Insured.id))).one()
     insureds = session.exec(
@@ -199,8 +287,8 @@ def list_insureds(page: int = 1, per_page: int = 10, session: Session = Depends(
     }
 
 @app.get("/insureds/{insured_id}")
-def get_insured(insured_id: int, session: Session = Depends(get_session)):
-    obj = session.get(Insured, insured_id)
+def get_insured(insured_id: int, request: Request, session: Session = Depends(get_read_session)):
+    obj = get_dimension(request, session, Insured, insured_id)
     if not obj:
         raise HTTPException(404, "Insured not found")
     return obj
@@ -208,10 +296,7 @@ def get_insured(insured_id: int, session: Session = Depends(get_session)):
 @app.post("/insureds", status_code=201)
 def create_insured(payload: InsuredCreate, session: Session = Depends(get_session)):
     obj = Insured(**payload.model_dump())
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj, created=True)
 
 @app.put("/insureds/{insured_id}")
 def update_insured(insured_id: int, payload: InsuredUpdate, session: Session = Depends(get_session)):
@@ -220,17 +305,14 @@ def update_insured(insured_id: int, payload: InsuredUpdate, session: Session = D
         raise HTTPException(404, "Insured not found")
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(obj, k, v)
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj)
 
 # Policy endpoints
 @app.get("/policies")
 def list_policies(
     page: int = 1, per_page: int = 10,
     policy_state: Optional[str] = None,
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_read_session)
 ):
     page, per_page = clamp_page(page), clamp_per_page(per_page)
     stmt = select(Policy)
@@ -243,8 +325,8 @@ def list_policies(
     return {"data": items, "page": Page(page=page, per_page=per_page, total=total)}
 
 @app.get("/policies/{policy_id}")
-def get_policy(policy_id: int, session: Session = Depends(get_session)):
-    obj = session.get(Policy, policy_id)
+def get_policy(policy_id: int, request: Request, session: Session = Depends(get_read_session)):
+    obj = get_dimension(request, session, Policy, policy_id)
     if not obj:
         raise HTTPException(404, "Policy not found")
     return obj
@@ -255,10 +337,7 @@ def create_policy(payload: PolicyCreate, session: Session = Depends(get_session)
     if exists:
         raise HTTPException(400, "Policy already exists")
     obj = Policy(**payload.model_dump())
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj, created=True)
 
 @app.put("/policies/{policy_id}")
 def update_policy(policy_id: int, payload: PolicyUpdate, session: Session = Depends(get_session)):
@@ -269,21 +348,18 @@ def update_policy(policy_id: int, payload: PolicyUpdate, session: Session = Depe
     data = payload.model_dump(exclude_unset=True)
     for k, v in data.items():
         setattr(obj, k, v)
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj)
 
 @app.get("/policies/{policy_id}/coverage-level")
-def get_policy_coverage_level(policy_id: int, session: Session = Depends(get_session)):
-    obj = session.get(Policy, policy_id)
+def get_policy_coverage_level(policy_id: int, request: Request, session: Session = Depends(get_read_session)):
+    obj = get_dimension(request, session, Policy, policy_id)
     if not obj:
         raise HTTPException(404, "Policy not found")
     return {"coverage_level": obj.coverageLevel()}
 
 # Vehicle endpoints
 @app.get("/vehicles")
-def list_vehicles(page: int = 1, per_page: int = 10, session: Session = Depends(get_session)):
+def list_vehicles(page: int = 1, per_page: int = 10, session: Session = Depends(get_read_session)):
     page, per_page = clamp_page(page), clamp_per_page(per_page)
     total = session.exec(select(func.count(Vehicle.id))).one()
     vehicles = session.exec(
@@ -297,8 +373,8 @@ def list_vehicles(page: int = 1, per_page: int = 10, session: Session = Depends(
     }
 
 @app.get("/vehicles/{vehicle_id}")
-def get_vehicle(vehicle_id: int, session: Session = Depends(get_session)):
-    obj = session.get(Vehicle, vehicle_id)
+def get_vehicle(vehicle_id: int, request: Request, session: Session = Depends(get_read_session)):
+    obj = get_dimension(request, session, Vehicle, vehicle_id)
     if not obj:
         raise HTTPException(404, "Vehicle not found")
     return obj
@@ -306,10 +382,7 @@ def get_vehicle(vehicle_id: int, session: Session = Depends(get_session)):
 @app.post("/vehicles", status_code=201)
 def create_vehicle(payload: VehicleCreate, session: Session = Depends(get_session)):
     obj = Vehicle(**payload.model_dump())
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj, created=True)
 
 @app.put("/vehicles/{vehicle_id}")
 def update_vehicle(vehicle_id: int, payload: VehicleUpdate, session: Session = Depends(get_session)):
@@ -318,28 +391,33 @@ def update_vehicle(vehicle_id: int, payload: VehicleUpdate, session: Session = D
         raise HTTPException(404, "Vehicle not found")
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(obj, k, v)
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj)
 
 # Incident endpoints
 @app.get("/incidents")
-def list_incidents(page: int = 1, per_page: int = 10, session: Session = Depends(get_session)):
+def list_incidents(
+    page: int = 1, per_page: int = 10,
+    state: Optional[str] = None,
+    year: Optional[int] = None,
+    session: Session = Depends(get_read_session)
+):
     page, per_page = clamp_page(page), clamp_per_page(per_page)
-    total = session.exec(select(func.count(Incident.id))).one()
-    incidents = session.exec(
-        select(Incident)
-        .offset((page - 1) * per_page)
-        .limit(per_page)
-    ).all()
+    stmt = select(Incident)
+
+    # estado/anio del incidente: solo se leen las particiones que coinciden
+    keys = prune(session, state, year)
+    if keys is not None:
+        stmt = stmt.where(Incident.partition_key.in_(keys))
+
+    total = session.exec(select(func.count()).select_from(stmt.subquery())).one()
+    incidents = session.exec(stmt.offset((page - 1) * per_page).limit(per_page)).all()
     return {
         "data": incidents,
         "page": Page(page=page, per_page=per_page, total=total)
     }
 
 @app.get("/incidents/{incident_id}")
-def get_incident(incident_id: int, session: Session = Depends(get_session)):
+def get_incident(incident_id: int, session: Session = Depends(get_read_session)):
     obj = session.get(Incident, incident_id)
     if not obj:
         raise HTTPException(404, "Incident not found")
@@ -348,10 +426,7 @@ def get_incident(incident_id: int, session: Session = Depends(get_session)):
 @app.post("/incidents", status_code=201)
 def create_incident(payload: IncidentCreate, session: Session = Depends(get_session)):
     obj = Incident(**payload.model_dump())
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj, created=True)
 
 @app.put("/incidents/{incident_id}")
 def update_incident(incident_id: int, payload: IncidentUpdate, session: Session = Depends(get_session)):
@@ -360,28 +435,33 @@ def update_incident(incident_id: int, payload: IncidentUpdate, session: Session
         raise HTTPException(404, "Incident not found")
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(obj, k, v)
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj)
 
 # Claim endpoints
 @app.get("/claims")
-def list_claims(page: int = 1, per_page: int = 10, session: Session = Depends(get_session)):
+def list_claims(
+    page: int = 1, per_page: int = 10,
+    state: Optional[str] = None,
+    year: Optional[int] = None,
+    session: Session = Depends(get_read_session)
+):
     page, per_page = clamp_page(page), clamp_per_page(per_page)
-    total = session.exec(select(func.count(Claim.id))).one()
-    claims = session.exec(
-        select(Claim)
-        .offset((page - 1) * per_page)
-        .limit(per_page)
-    ).all()
+    stmt = select(Claim)
+
+    # estado/anio del incidente: solo se leen las particiones que coinciden
+    keys = prune(session, state, year)
+    if keys is not None:
+        stmt = stmt.where(Claim.partition_key.in_(keys))
+
+    total = session.exec(select(func.count()).select_from(stmt.subquery())).one()
+    claims = session.exec(stmt.offset((page - 1) * per_page).limit(per_page)).all()
     return {
         "data": claims,
         "page": Page(page=page, per_page=per_page, total=total)
     }
 
 @app.get("/claims/{claim_id}")
-def get_claim(claim_id: int, session: Session = Depends(get_session)):
+def get_claim(claim_id: int, session: Session = Depends(get_read_session)):
     obj = session.get(Claim, claim_id)
     if not obj:
         raise HTTPException(404, "Claim not found")
@@ -390,10 +470,7 @@ def get_claim(claim_id: int, session: Session = Depends(get_session)):
 @app.post("/claims", status_code=201)
 def create_claim(payload: ClaimCreate, session: Session = Depends(get_session)):
     obj = Claim(**payload.model_dump())
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj, created=True)
 
 @app.put("/claims/{claim_id}")
 def update_claim(claim_id: int, payload: ClaimUpdate, session: Session = Depends(get_session)):
@@ -402,13 +479,10 @@ def update_claim(claim_id: int, payload: ClaimUpdate, session: Session = Depends
         raise HTTPException(404, "Claim not found")
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(obj, k, v)
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj)
 
 @app.get("/claims/{claim_id}/fraud-check")
-def get_claim_fraud_check(claim_id: int, session: Session = Depends(get_session)):
+def get_claim_fraud_check(claim_id: int, session: Session = Depends(get_read_session)):
     obj = session.get(Claim, claim_id)
     if not obj:
         raise HTTPException(404, "Claim not found")
@@ -416,7 +490,7 @@ def get_claim_fraud_check(claim_id: int, session: Session = Depends(get_session)
 
 # Case endpoints
 @app.get("/cases")
-def list_cases(page: int = 1, per_page: int = 10, session: Session = Depends(get_session)):
+def list_cases(page: int = 1, per_page: int = 10, session: Session = Depends(get_read_session)):
     page, per_page = clamp_page(page), clamp_per_page(per_page)
     total = session.exec(select(func.count(Case.id))).one()
     cases = session.exec(
@@ -430,13 +504,12 @@ def list_cases(page: int = 1, per_page: int = 10, session: Session = Depends(get
     }
 
 @app.get("/cases/{case_id}")
-def get_case(case_id: int, session: Session = Depends(get_session)):
+def get_case(case_id: int, request: Request, session: Session = Depends(get_read_session)):
     obj = session.get(Case, case_id)
     if not obj:
         raise HTTPException(404, "Case not found")
     
-    # Load related objects
-    session.refresh(obj)
+    # Load related objects (las dimensiones chicas salen del cache en memoria)
     return CaseResponse(
         id=obj.id,
         insured_id=obj.insured_id,
@@ -444,13 +517,38 @@ def get_case(case_id: int, session: Session = Depends(get_session)):
         vehicle_id=obj.vehicle_id,
         incident_id=obj.incident_id,
         claim_id=obj.claim_id,
-        insured=obj.insured,
-        policy=obj.policy,
-        vehicle=obj.vehicle,
+        insured=get_dimension(request, session, Insured, obj.insured_id),
+        policy=get_dimension(request, session, Policy, obj.policy_id),
+        vehicle=get_dimension(request, session, Vehicle, obj.vehicle_id),
         incident=obj.incident,
         claim=obj.claim
     )
 
+@app.get("/cases/{case_id}/similar")
+def get_similar_cases(case_id: int, k: int = 10, metric: str = "cosine", session: Session = Depends(get_read_session)):
+    # import diferido: NumPy no se carga en el import de la API
+    from .similarity import METRICS, IndexNotReady, similarity_index
+    if metric not in METRICS:
+        raise HTTPException(400, f"metric must be one of: {', '.join(METRICS)}")
+    k = max(1, min(k, 100))
+    try:
+        neighbors = similarity_index.similar(case_id, k, metric)
+    except IndexNotReady:
+        raise HTTPException(503, "Similarity index is still building", headers={"Retry-After": "5"})
+    if neighbors is None:
+        raise HTTPException(404, "Case not found")
+    facts = {
+        f.case_id: f
+        for f in session.exec(
+            select(CaseFact).where(CaseFact.case_id.in_([n["case_id"] for n in neighbors]))
+        ).all()
+    }
+    return {
+        "case_id": case_id,
+        "metric": metric,
+        "data": [{**n, "case": facts.get(n["case_id"])} for n in neighbors]
+    }
+
 @app.post("/cases", status_code=201)
 def create_case(payload: CaseCreate, session: Session = Depends(get_session)):
     # Validate foreign keys exist
@@ -466,10 +564,7 @@ def create_case(payload: CaseCreate, session: Session = Depends(get_session)):
         raise HTTPException(400, "Claim does not exist")
     
     obj = Case(**payload.model_dump())
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj, created=True)
 
 @app.put("/cases/{case_id}")
 def update_case(case_id: int, payload: CaseUpdate, session: Session = Depends(get_session)):
@@ -493,25 +588,146 @@ def update_case(case_id: int, payload: CaseUpdate, session: Session = Depends(ge
     
     for k, v in data.items():
         setattr(obj, k, v)
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
-    return obj
+    return save(session, obj)
+
+@app.get("/profile")
+def get_profile(source: Optional[str] = None, session: Session = Depends(get_read_session)):
+    # ultimo perfil de calidad guardado (por el loader, /ingest/csv o server.profiling)
+    profile = latest_profile(session, source)
+    if not profile:
+        raise HTTPException(404, "Profile not found")
+    return profile
+
+@app.get("/changes")
+def list_changes(since: int = 0, limit: int = 100, session: Session = Depends(get_read_session)):
+    # feed incremental: el cliente guarda "next" y lo manda como since
+    return changes_since(session, since, limit)
+
+@app.get("/cache/stats")
+def cache_stats():
+    # filas y bytes aproximados por tabla del cache de dimensiones
+    return dimension_cache.stats()
 
 @app.get("/stats")
-def stats(session: Session = Depends(get_session)):
-    return {
+def stats(
+    state: Optional[str] = None,
+    year: Optional[int] = None,
+    session: Session = Depends(snapshots.get_analytics_session)
+):
+    # con state/year los totales de incidentes, claims y cases se limitan a
+    # esas particiones; insureds, policies y vehicles no se particionan
+    keys = prune(session, state, year)
+    incidents = select(func.count(Incident.id))
+    claims = select(func.count(Claim.id))
+    amount = select(func.coalesce(func.sum(Claim.total_claim_amount), 0))
+    cases = select(func.count(Case.id))
+    if keys is not None:
+        incidents = incidents.where(Incident.partition_key.in_(keys))
+        claims = claims.where(Claim.partition_key.in_(keys))
+        amount = amount.where(Claim.partition_key.in_(keys))
+        cases = cases.join(Incident, Case.incident_id == Incident.id).where(Incident.partition_key.in_(keys))
+    result = {
         "total_insureds": session.exec(select(func.count(Insured.id))).one(),
         "total_policies": session.exec(select(func.count(Policy.id))).one(),
         "total_vehicles": session.exec(select(func.count(Vehicle.id))).one(),
-        "total_incidents": session.exec(select(func.count(Incident.id))).one(),
-        "total_claims": session.exec(select(func.count(Claim.id))).one(),
-        "total_cases": session.exec(select(func.count(Case.id))).one(),
-        "fraud_claims": session.exec(
-            select(func.count(Claim.id)).where(Claim.fraud_reported == True)
-        ).one(),
-        "total_claims_amount": session.exec(
-            select(func.coalesce(func.sum(Claim.total_claim_amount), 0))
-        ).one()
+        "total_incidents": session.exec(incidents).one(),
+        "total_claims": session.exec(claims).one(),
+        "total_cases": session.exec(cases).one(),
+        "fraud_claims": session.exec(claims.where(Claim.fraud_reported == True)).one(),
+        "total_claims_amount": session.exec(amount).one()
+    }
+    if keys is not None:
+        result["partitions"] = keys
+    return result
+
+@app.get("/partitions")
+def list_partitions(session: Session = Depends(snapshots.get_analytics_session)):
+    # catalogo de particiones (estado-anio) con sus filas
+    return {"data": catalog(session)}
+
+
+
+# Analytics endpoints (leen de case_fact, sin joins)
+@app.get("/analytics/breakdown")
+def analytics_breakdown(by: str = "incident_severity", session: Session = Depends(snapshots.get_analytics_session)):
+    if by not in GROUPABLE:
+        raise HTTPException(400, f"Cannot group by '{by}'. Options: {', '.join(sorted(GROUPABLE))}")
+    return {"by": by, "data": breakdown(session, by)}
+
+@app.get("/analytics/timeseries")
+def analytics_timeseries(
+    interval: str = "day",
+    from_: Optional[date] = Query(None, alias="from"),
+    to: Optional[date] = None,
+    state: Optional[str] = None,
+    session: Session = Depends(snapshots.get_analytics_session)
+):
+    if interval not in INTERVALS:
+        raise HTTPException(400, f"interval must be one of: {', '.join(INTERVALS)}")
+    return {
+        "interval": interval,
+        "data": timeseries(session, interval, from_, to, state)
     }
 
+# Job endpoints (cargas de CSV en segundo plano)
+@app.post("/jobs/import", status_code=202)
+def create_import_job(
+    path: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    batch_size: int = Form(500),
+    session: Session = Depends(get_session)
+):
+    if (path is None) == (file is None):
+        raise HTTPException(400, "Send either a server-side 'path' or an uploaded 'file'")
+    if batch_size < 1:
+        raise HTTPException(400, "batch_size must be positive")
+    if file is not None:
+        os.makedirs(jobs.UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(jobs.UPLOAD_DIR, f"import-{uuid.uuid4().hex}.csv")
+        with open(path, "wb") as out:
+            shutil.copyfileobj(file.file, out)
+    else:
+        # solo archivos de los directorios de importacion, nunca cualquier ruta del server
+        path = jobs.resolve_import_path(path)
+        if path is None:
+            raise HTTPException(400, "Path is outside the allowed import directories")
+        if not os.path.isfile(path):
+            raise HTTPException(400, "File not found")
+    job = ImportJob(source_path=os.path.abspath(path), batch_size=batch_size)
+    return jobs.job_view(jobs.submit(session, job))
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return jobs.job_view(job)
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if job.status not in ("queued", "running"):
+        raise HTTPException(409, f"Job is {job.status}")
+    return jobs.job_view(jobs.cancel(session, job))
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+def resume_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if job.status not in jobs.RESUMABLE:
+        raise HTTPException(409, f"Job is {job.status}")
+    return jobs.job_view(jobs.submit(session, job))
+
+# Ingesta por streaming: el CSV se procesa mientras se sube, por lotes
+@app.post("/ingest/csv")
+async def ingest_csv(request: Request, batch_size: int = 500, profile: bool = PROFILE_LOADS):
+    if batch_size < 1:
+        raise HTTPException(400, "batch_size must be positive")
+    try:
+        return await ingest_stream(request.stream(), batch_size, profile)
+    except IngestError as e:
+        # con los lotes que si quedaron confirmados, para poder retomar
+        return JSONResponse(status_code=e.status_code, content={"detail": str(e), **e.result})
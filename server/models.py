@@ -1,12 +1,14 @@
-from typing import Optional,List
-from sqlmodel import SQLModel, Field, Relationship
-from datetime import date
+from typing import Optional,List,Dict,Any
+from sqlmodel import SQLModel, Field, Relationship, Column, JSON, Index
+from datetime import date, datetime, timezone
 
 
 # -----------------------------
 # Clase: Insured
 # -----------------------------
 class Insured(SQLModel, table=True):
+    # llave natural de los get-or-create del loader
+    __table_args__ = (Index("ix_insured_natural_key", "age", "sex", "education_level", "occupation", "zip_code"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     age: Optional[int]
     sex: Optional[str]
@@ -64,6 +66,8 @@ class Policy(SQLModel, table=True):
 # Clase: Vehículo
 # -----------------------------
 class Vehicle(SQLModel, table=True):
+    # llave natural de los get-or-create del loader
+    __table_args__ = (Index("ix_vehicle_natural_key", "make", "model", "year"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     make: Optional[str] # marca, como "Toyota", "Ford", "Chevrolet", etc.
     model: Optional[str]
@@ -90,6 +94,8 @@ class Incident(SQLModel, table=True):
     bodily_injuries: Optional[int]
     witnesses: Optional[int]
     police_report_available: Optional[bool]
+    # "<incident_state>-<anio>", la asigna server/partitions.py
+    partition_key: Optional[str] = Field(default=None, index=True)
     # Relación 1:N con Case.
     cases: List["Case"] = Relationship(back_populates="incident")
     
@@ -108,6 +114,8 @@ class Claim(SQLModel, table=True):
     property_claim: Optional[int]
     vehicle_claim: Optional[int]
     fraud_reported: Optional[bool]
+    # la particion del incidente de su Case (server/partitions.py)
+    partition_key: Optional[str] = Field(default=None, index=True)
     # Relación 1:N con Case.
     cases: List["Case"] = Relationship(back_populates="claim")
     
@@ -138,4 +146,133 @@ class Case(SQLModel, table=True):
     # Métodos
     # lossRatio() float (claim.componentsSum() / policy.annual_premium)
     # bindToIncidentDays() int (days between bind_date and incident.date)
-    # riskSignals() list (list of risk signals)
\ No newline at end of file
+    # riskSignals() list (list of risk signals)
+
+# -----------------------------
+# Clase: CaseFact (vista desnormalizada de Case para lecturas analiticas)
+# -----------------------------
+# Una fila por Case con las columnas de las cinco dimensiones ya unidas y las
+# metricas derivadas precalculadas. La mantiene server/facts.py; no se escribe
+# directamente desde los endpoints.
+class CaseFact(SQLModel, table=True):
+    __tablename__ = "case_fact"
+    case_id: int = Field(primary_key=True, foreign_key="case.id")
+    # Insured
+    insured_id: Optional[int]
+    insured_age: Optional[int]
+    insured_sex: Optional[str]
+    insured_education_level: Optional[str]
+    insured_occupation: Optional[str]
+    insured_zip: Optional[int]
+    # Policy
+    policy_id: Optional[int]
+    policy_number: Optional[int]
+    policy_state: Optional[str]
+    policy_csl: Optional[str]
+    policy_deductible: Optional[int]
+    policy_annual_premium: Optional[float]
+    coverage_level: Optional[str]
+    # Vehicle
+    vehicle_id: Optional[int]
+    vehicle_make: Optional[str]
+    vehicle_model: Optional[str]
+    vehicle_year: Optional[int]
+    # Incident
+    incident_id: Optional[int]
+    incident_date: Optional[date]
+    incident_type: Optional[str]
+    collision_type: Optional[str]
+    incident_severity: Optional[str]
+    incident_state: Optional[str]
+    incident_city: Optional[str]
+    hour_of_day: Optional[int]
+    witnesses: Optional[int]
+    police_report_available: Optional[bool]
+    # Claim
+    claim_id: Optional[int]
+    total_claim_amount: Optional[int]
+    injury_claim: Optional[int]
+    property_claim: Optional[int]
+    vehicle_claim: Optional[int]
+    fraud_reported: Optional[bool]
+    # Metricas derivadas
+    loss_ratio: Optional[float] # total_claim_amount / annual_premium
+    bind_to_incident_days: Optional[int] # dias entre bind_date e incident.date
+    is_night: Optional[bool] # incidente entre 22 y 5 h
+
+
+# -----------------------------
+# Clase: ClaimRollup (agregados diarios por fecha de incidente y estado)
+# -----------------------------
+# Un bucket por (dia, estado del incidente). Lo mantiene server/rollups.py a
+# partir de los cambios en case_fact; state "" agrupa los incidentes sin estado.
+class ClaimRollup(SQLModel, table=True):
+    __tablename__ = "claim_rollup"
+    day: date = Field(primary_key=True)
+    state: str = Field(primary_key=True)
+    claims: int = 0
+    claim_amount: int = 0
+    fraud_claims: int = 0
+
+
+# -----------------------------
+# Clase: PartitionCatalog (particiones logicas en uso)
+# -----------------------------
+# Una fila por partition_key que alguna vez tuvo un incidente. La mantiene
+# server/partitions.py al escribir; puede sobrar alguna llave (filas borradas
+# o movidas) pero nunca faltar, asi que sirve para podar sin leer las tablas.
+class PartitionCatalog(SQLModel, table=True):
+    __tablename__ = "partition_catalog"
+    key: str = Field(primary_key=True)
+
+
+# -----------------------------
+# Clase: ImportJob (cargas de CSV en segundo plano)
+# -----------------------------
+# status: queued -> running -> completed | failed | cancelled
+#         (cancelling mientras el worker termina su lote; interrupted si el
+#         servidor se reinicio con el job en curso)
+# rows_done es la ultima fila confirmada: un resume retoma desde ahi.
+class ImportJob(SQLModel, table=True):
+    __tablename__ = "import_job"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source_path: str
+    status: str = Field(default="queued", index=True)
+    rows_total: Optional[int] = None
+    rows_done: int = 0
+    rows_per_sec: Optional[float] = None
+    batch_size: int = 500
+    stats: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = None
+    worker: Optional[str] = None # "host:pid" del proceso a cargo (la API en cola, el worker al correr)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# -----------------------------
+# Clase: ChangeLog (feed de cambios para sincronizacion incremental)
+# -----------------------------
+# Cada create/update de la API y del loader agrega una fila; rev es creciente
+# y, como SQLite serializa las escrituras, el orden de rev es el de commit.
+class ChangeLog(SQLModel, table=True):
+    __tablename__ = "change_log"
+    rev: Optional[int] = Field(default=None, primary_key=True)
+    entity: str # nombre de la tabla: "insured", "policy", "case", ...
+    entity_id: int
+    op: str # "create" | "update"
+    payload: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    changed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# -----------------------------
+# Clase: DataProfile (perfil de calidad de un CSV cargado o perfilado)
+# -----------------------------
+# columns: {columna: {nulls, placeholders, inferred_type, cardinality, min, max, top_values}}
+class DataProfile(SQLModel, table=True):
+    __tablename__ = "data_profile"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source: str = Field(index=True) # nombre del archivo, o "ingest" para /ingest/csv
+    rows: int
+    columns: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
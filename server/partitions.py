@@ -0,0 +1,165 @@
+"""
+Particionado logico de incident y claim por estado y anio del incidente.
+
+Cada Incident lleva partition_key = "<incident_state>-<anio de date>" (por
+ejemplo "OH-2015"; "?" donde falta el dato) y cada Claim hereda la de su
+incidente a traves del Case. La columna esta indexada, asi que un filtro por
+estado o anio se resuelve primero contra el catalogo de particiones (la tabla
+partition_catalog, unas pocas filas) y despues con partition_key IN (...):
+solo se recorren las filas de esas particiones.
+
+La llave se asigna sola: los eventos de abajo la calculan en cada insert o
+update de Incident (endpoints, loader, jobs, /ingest/csv) y la anotan en el
+catalogo; los inserts por lote del loader la anotan con register_keys, y
+refresh_case_facts la copia al Claim cuando un Case los une.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import event, insert, update
+from sqlmodel import Session, select, func
+from server.db import on_conflict_insert
+from server.models import Incident, Claim, Case, PartitionCatalog
+
+UNKNOWN = "?"
+
+# Filas por UPDATE en el backfill (limite de parametros de SQLite)
+CHUNK_SIZE = 500
+
+
+def partition_key(state: Optional[str], day: Any) -> str:
+    return f"{state or UNKNOWN}-{day.year if day else UNKNOWN}"
+
+
+def split_key(key: str) -> Dict[str, Any]:
+    state, _, year = key.rpartition("-")
+    return {
+        "state": None if state == UNKNOWN else state,
+        "year": None if year == UNKNOWN else int(year),
+    }
+
+
+@event.listens_for(Incident, "before_insert")
+@event.listens_for(Incident, "before_update")
+def _route_incident(mapper, connection, target: Incident) -> None:
+    target.partition_key = partition_key(target.incident_state, target.date)
+    register_keys(connection, [target.partition_key])
+
+
+def register_keys(connection, keys: Iterable[str]) -> None:
+    """Anota las llaves en el catalogo (las que ya estan se ignoran). Acepta Session o Connection"""
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+    bind = connection.get_bind() if isinstance(connection, Session) else connection
+    upsert = on_conflict_insert(bind)
+    if upsert is not None:
+        connection.execute(upsert(PartitionCatalog).values([{"key": key} for key in keys]).on_conflict_do_nothing())
+        return
+    # motores sin ON CONFLICT: solo las que faltan
+    keys -= set(connection.execute(select(PartitionCatalog.key).where(PartitionCatalog.key.in_(keys))).scalars())
+    if keys:
+        connection.execute(insert(PartitionCatalog).values([{"key": key} for key in keys]))
+
+
+def partition_keys(session: Session) -> List[str]:
+    """Catalogo: las particiones que tuvieron al menos un incidente"""
+    return list(session.exec(select(PartitionCatalog.key).order_by(PartitionCatalog.key)).all())
+
+
+def prune(session: Session, state: Optional[str] = None, year: Optional[int] = None) -> Optional[List[str]]:
+    """Particiones que pueden tener filas del filtro; None si no hay filtro"""
+    if state is None and year is None:
+        return None
+    keys = []
+    for key in partition_keys(session):
+        parts = split_key(key)
+        if state is not None and parts["state"] != state:
+            continue
+        if year is not None and parts["year"] != year:
+            continue
+        keys.append(key)
+    return keys
+
+
+def catalog(session: Session) -> List[Dict[str, Any]]:
+    """Filas por particion, contadas sobre el indice de partition_key"""
+    incidents = dict(session.exec(
+        select(Incident.partition_key, func.count(Incident.id)).group_by(Incident.partition_key)
+    ).all())
+    claims = dict(session.exec(
+        select(Claim.partition_key, func.count(Claim.id)).group_by(Claim.partition_key)
+    ).all())
+    keys = sorted((set(incidents) | set(claims)) - {None})
+    return [
+        {"key": key, **split_key(key), "incidents": incidents.get(key, 0), "claims": claims.get(key, 0)}
+        for key in keys
+    ]
+
+
+def _claim_incident_key():
+    # particion del incidente del Case de cada claim (subconsulta correlacionada)
+    return (
+        select(Incident.partition_key)
+        .join(Case, Case.incident_id == Incident.id)
+        .where(Case.claim_id == Claim.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def partitions_pending(session: Session) -> bool:
+    """
+    Si algun incidente o claim (con incidente) no tiene partition_key, o si el
+    catalogo esta vacio con incidentes cargados. Solo lee, sobre el indice de
+    partition_key
+    """
+    if session.exec(select(Incident.id).where(Incident.partition_key == None).limit(1)).first():  # noqa: E711
+        return True
+    claim = session.exec(
+        select(Claim.id)
+        .where(Claim.partition_key == None, _claim_incident_key() != None)  # noqa: E711
+        .limit(1)
+    ).first()
+    if claim is not None:
+        return True
+    if session.exec(select(PartitionCatalog.key).limit(1)).first() is not None:
+        return False
+    return session.exec(select(Incident.id).limit(1)).first() is not None
+
+
+def backfill_partitions(session: Session) -> int:
+    """
+    Asigna partition_key a las filas creadas antes de que existiera la
+    columna y llena el catalogo si esta vacio. Hace commit solo si escribio.
+    Devuelve cuantos incidentes actualizo.
+    """
+    if not partitions_pending(session):
+        return 0
+    pending = session.exec(
+        select(Incident.id, Incident.incident_state, Incident.date)
+        .where(Incident.partition_key == None)  # noqa: E711
+    ).all()
+    by_key: Dict[str, List[int]] = {}
+    for incident_id, state, day in pending:
+        by_key.setdefault(partition_key(state, day), []).append(incident_id)
+    for key, ids in by_key.items():
+        for start in range(0, len(ids), CHUNK_SIZE):
+            session.execute(
+                update(Incident)
+                .where(Incident.id.in_(ids[start:start + CHUNK_SIZE]))
+                .values(partition_key=key)
+            )
+
+    # cada claim hereda la particion del incidente de su Case; los claims sin
+    # Case se quedan sin particion
+    incident_key = _claim_incident_key()
+    session.execute(
+        update(Claim)
+        .where(Claim.partition_key == None, incident_key != None)  # noqa: E711
+        .values(partition_key=incident_key)
+    )
+
+    # bases anteriores al catalogo: se arma una vez desde las llaves en uso
+    if session.exec(select(PartitionCatalog.key).limit(1)).first() is None:
+        register_keys(session, session.exec(select(Incident.partition_key).distinct()).all())
+    session.commit()
+    return len(pending)
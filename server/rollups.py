@@ -0,0 +1,156 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case as sql_case, delete, insert, update
+from sqlmodel import Session, select, func
+from server.db import on_conflict_insert
+from server.models import CaseFact, ClaimRollup
+
+INTERVALS = ("day", "week", "month")
+
+Bucket = Tuple[date, str]
+
+# Buckets por sentencia de upsert (5 parametros cada uno; limite de SQLite)
+UPSERT_CHUNK = 1000
+
+
+def _bucket_key(fact: Dict[str, Any]) -> Optional[Bucket]:
+    # sin fecha de incidente o sin claim el caso no entra en la serie
+    if fact.get("incident_date") is None or fact.get("claim_id") is None:
+        return None
+    return fact["incident_date"], fact.get("incident_state") or ""
+
+
+def apply_fact_delta(session: Session, old_facts: Iterable[Dict[str, Any]],
+                     new_facts: Iterable[Dict[str, Any]]) -> None:
+    """
+    Ajusta los buckets restando la contribucion de las filas viejas de
+    case_fact y sumando la de las nuevas (sin commit). La diferencia se junta
+    por bucket y se escribe con un solo INSERT ... ON CONFLICT DO UPDATE
+    (SQLite, PostgreSQL); en otros motores, UPDATE y si no habia bucket INSERT.
+    """
+    deltas: Dict[Bucket, List[int]] = defaultdict(lambda: [0, 0, 0])
+    for sign, facts in ((-1, old_facts), (1, new_facts)):
+        for fact in facts:
+            key = _bucket_key(fact)
+            if key is None:
+                continue
+            delta = deltas[key]
+            delta[0] += sign
+            delta[1] += sign * (fact.get("total_claim_amount") or 0)
+            delta[2] += sign * (1 if fact.get("fraud_reported") else 0)
+
+    rows = [
+        {"day": day, "state": state, "claims": claims, "claim_amount": amount, "fraud_claims": fraud}
+        for (day, state), (claims, amount, fraud) in deltas.items()
+        if claims or amount or fraud
+    ]
+    upsert = on_conflict_insert(session.get_bind())
+    if upsert is not None:
+        for start in range(0, len(rows), UPSERT_CHUNK):
+            stmt = upsert(ClaimRollup).values(rows[start:start + UPSERT_CHUNK])
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[ClaimRollup.day, ClaimRollup.state],
+                set_={
+                    "claims": ClaimRollup.claims + stmt.excluded.claims,
+                    "claim_amount": ClaimRollup.claim_amount + stmt.excluded.claim_amount,
+                    "fraud_claims": ClaimRollup.fraud_claims + stmt.excluded.fraud_claims,
+                },
+            ))
+    else:
+        for row in rows:
+            updated = session.execute(
+                update(ClaimRollup)
+                .where(ClaimRollup.day == row["day"], ClaimRollup.state == row["state"])
+                .values(
+                    claims=ClaimRollup.claims + row["claims"],
+                    claim_amount=ClaimRollup.claim_amount + row["claim_amount"],
+                    fraud_claims=ClaimRollup.fraud_claims + row["fraud_claims"],
+                )
+            )
+            if not updated.rowcount:
+                session.execute(insert(ClaimRollup).values(row))
+    # los buckets que se quedaron sin claims se borran
+    emptied = sorted({row["day"] for row in rows if row["claims"] < 0})
+    for start in range(0, len(emptied), UPSERT_CHUNK):
+        session.execute(
+            delete(ClaimRollup)
+            .where(ClaimRollup.day.in_(emptied[start:start + UPSERT_CHUNK]), ClaimRollup.claims <= 0)
+        )
+
+
+def rebuild_rollups(session: Session) -> int:
+    """Recalcula todos los buckets desde case_fact (sin commit). Devuelve cuantos quedaron"""
+    state = func.coalesce(CaseFact.incident_state, "")
+    rows = session.exec(
+        select(
+            CaseFact.incident_date,
+            state,
+            func.count(CaseFact.case_id),
+            func.coalesce(func.sum(CaseFact.total_claim_amount), 0),
+            func.sum(sql_case((CaseFact.fraud_reported == True, 1), else_=0)),  # noqa: E712
+        )
+        .where(CaseFact.incident_date != None, CaseFact.claim_id != None)  # noqa: E711
+        .group_by(CaseFact.incident_date, state)
+    ).all()
+    session.execute(delete(ClaimRollup))
+    if rows:
+        session.execute(insert(ClaimRollup), [
+            {"day": day, "state": st, "claims": n, "claim_amount": amount, "fraud_claims": fraud or 0}
+            for day, st, n, amount, fraud in rows
+        ])
+    return len(rows)
+
+
+def rollups_pending(session: Session) -> bool:
+    """Si claim_rollup esta vacia pero case_fact no. Solo lee"""
+    if session.exec(select(ClaimRollup.day).limit(1)).first() is not None:
+        return False
+    return session.exec(select(CaseFact.case_id).limit(1)).first() is not None
+
+
+def backfill_rollups(session: Session) -> int:
+    """Reconstruye los buckets si la tabla esta vacia pero case_fact no. Hace commit"""
+    if not rollups_pending(session):
+        return 0
+    created = rebuild_rollups(session)
+    session.commit()
+    return created
+
+
+def period_start(day: date, interval: str) -> date:
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def timeseries(session: Session, interval: str = "day", date_from: Optional[date] = None,
+               date_to: Optional[date] = None, state: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Combina los buckets diarios en periodos de `interval`, ordenados por fecha"""
+    stmt = select(ClaimRollup)
+    if date_from:
+        stmt = stmt.where(ClaimRollup.day >= date_from)
+    if date_to:
+        stmt = stmt.where(ClaimRollup.day <= date_to)
+    if state:
+        stmt = stmt.where(ClaimRollup.state == state)
+
+    periods: Dict[date, List[int]] = defaultdict(lambda: [0, 0, 0])
+    for bucket in session.exec(stmt).all():
+        acc = periods[period_start(bucket.day, interval)]
+        acc[0] += bucket.claims
+        acc[1] += bucket.claim_amount
+        acc[2] += bucket.fraud_claims
+
+    return [
+        {
+            "period": start,
+            "claims": claims,
+            "claim_amount": amount,
+            "fraud_claims": fraud,
+            "fraud_rate": fraud / claims if claims else 0.0,
+        }
+        for start, (claims, amount, fraud) in sorted(periods.items())
+    ]
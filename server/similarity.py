@@ -0,0 +1,337 @@
+"""
+Indice de vectores de caracteristicas para "claims parecidos a este".
+
+Cada Case se describe con un vector float32 armado desde case_fact: montos
+(estandarizados), severidad, tipo de incidente y nivel de cobertura en one-hot,
+hora del dia (seno/coseno, para que 23 h quede cerca de 0 h), testigos y
+antiguedad del vehiculo. Todos viven en una sola matriz contigua; la busqueda
+top-k es un producto matricial mas argpartition.
+
+Con muchos casos (IVF_THRESHOLD) se entrena un cuantizador grueso (k-means
+sobre una muestra) y cada consulta solo compara contra las celdas mas cercanas
+(nprobe), que es lo que lo mantiene rapido con 1M de casos.
+
+Se construye en un hilo al arrancar la API (o al primer uso si SIMILARITY_WARM=0);
+hasta que esta listo, similar() lanza IndexNotReady y la API responde 503. Se
+mantiene con update() despues de cada commit que refresca case_fact en este
+proceso, incluso mientras se construye. Lo que otros procesos agregan (jobs,
+CLI) se incorpora al buscar, leyendo los case_id nuevos.
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from sqlmodel import Session, select
+from server.models import CaseFact
+
+logger = logging.getLogger(__name__)
+
+SEVERITIES = ["Trivial Damage", "Minor Damage", "Major Damage", "Total Loss"]
+INCIDENT_TYPES = ["Single Vehicle Collision", "Multi-vehicle Collision", "Vehicle Theft", "Parked Car"]
+COVERAGE_LEVELS = ["Low", "Medium", "High"]
+AMOUNTS = ["total_claim_amount", "injury_claim", "property_claim", "vehicle_claim"]
+
+NUMERIC = AMOUNTS + ["witnesses", "vehicle_age"]
+DIM = len(NUMERIC) + 2 + len(SEVERITIES) + len(INCIDENT_TYPES) + len(COVERAGE_LEVELS)
+
+IVF_THRESHOLD = 100_000
+NPROBE = 8
+METRICS = ("cosine", "euclidean")
+
+
+class IndexNotReady(Exception):
+    """El indice todavia se esta construyendo"""
+
+FEATURE_COLUMNS = [
+    CaseFact.case_id, CaseFact.total_claim_amount, CaseFact.injury_claim,
+    CaseFact.property_claim, CaseFact.vehicle_claim, CaseFact.witnesses,
+    CaseFact.vehicle_year, CaseFact.incident_date, CaseFact.hour_of_day,
+    CaseFact.incident_severity, CaseFact.incident_type, CaseFact.coverage_level,
+]
+
+
+def _one_hot(value: Optional[str], vocabulary: List[str]) -> List[float]:
+    return [1.0 if value == v else 0.0 for v in vocabulary]
+
+
+def raw_features(fact: Dict[str, Any]) -> List[float]:
+    """Vector sin estandarizar; los faltantes numericos quedan en NaN"""
+    def num(value):
+        return np.nan if value is None else float(value)
+
+    incident_date, year = fact.get("incident_date"), fact.get("vehicle_year")
+    vehicle_age = incident_date.year - year if incident_date and year else None
+    hour = fact.get("hour_of_day")
+    angle = 2 * np.pi * hour / 24 if hour is not None else None
+    return (
+        [num(fact.get(name)) for name in AMOUNTS]
+        + [num(fact.get("witnesses")), num(vehicle_age)]
+        + ([np.sin(angle), np.cos(angle)] if angle is not None else [0.0, 0.0])
+        + _one_hot(fact.get("incident_severity"), SEVERITIES)
+        + _one_hot(fact.get("incident_type"), INCIDENT_TYPES)
+        + _one_hot(fact.get("coverage_level"), COVERAGE_LEVELS)
+    )
+
+
+class SimilarityIndex:
+    def __init__(self, engine=None):
+        self.engine = engine
+        self._lock = threading.RLock()
+        self.built = False
+        self.count = 0
+        self.max_case_id = 0
+        self.matrix = np.zeros((0, DIM), dtype=np.float32)
+        self.unit = np.zeros((0, DIM), dtype=np.float32)   # filas normalizadas (coseno)
+        self.case_ids = np.zeros(0, dtype=np.int64)
+        self.row_of: Dict[int, int] = {}
+        self.mean = np.zeros(len(NUMERIC), dtype=np.float32)
+        self.std = np.ones(len(NUMERIC), dtype=np.float32)
+        self.centroids: Optional[np.ndarray] = None
+        self.assign = np.zeros(0, dtype=np.int32)
+        self.building = False
+        self._pending: List[Dict[str, Any]] = []  # update() recibidos durante build()
+        self._thread: Optional[threading.Thread] = None
+
+    def _engine(self):
+        if self.engine is None:
+            from server.db import engine
+            self.engine = engine
+        return self.engine
+
+    # -- armado de vectores --
+    def _vectors(self, facts: List[Dict[str, Any]]) -> np.ndarray:
+        raw = np.array([raw_features(f) for f in facts], dtype=np.float32).reshape(-1, DIM)
+        numeric = raw[:, :len(NUMERIC)]
+        numeric = (numeric - self.mean) / self.std
+        numeric[np.isnan(numeric)] = 0.0  # faltante = valor promedio
+        raw[:, :len(NUMERIC)] = numeric
+        return raw
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, rows: int) -> None:
+        capacity = self.matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        for name in ("matrix", "unit"):
+            grown = np.zeros((new_capacity, DIM), dtype=np.float32)
+            grown[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, grown)
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        ids[:self.count] = self.case_ids[:self.count]
+        self.case_ids = ids
+        assign = np.zeros(new_capacity, dtype=np.int32)
+        assign[:self.count] = self.assign[:self.count]
+        self.assign = assign
+
+    # -- cuantizador grueso --
+    def _nearest_centroid(self, unit: np.ndarray) -> np.ndarray:
+        out = np.empty(len(unit), dtype=np.int32)
+        for start in range(0, len(unit), 65_536):
+            block = unit[start:start + 65_536]
+            out[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return out
+
+    def _train_quantizer(self, iterations: int = 10, seed: int = 0) -> None:
+        n = self.count
+        nlist = int(min(1024, max(16, np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = self.unit[rng.choice(n, size=min(n, nlist * 40), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+        self.centroids = centroids
+        self.assign[:n] = self._nearest_centroid(self.unit[:n])
+        logger.info(f"Similarity quantizer trained: {nlist} cells over {n} cases")
+
+    # -- construccion y mantenimiento --
+    def _read_facts(self, session: Session, after_case_id: int = 0, batch: int = 50_000):
+        last = after_case_id
+        while True:
+            rows = session.exec(
+                select(*FEATURE_COLUMNS)
+                .where(CaseFact.case_id > last)
+                .order_by(CaseFact.case_id)
+                .limit(batch)
+            ).all()
+            if not rows:
+                return
+            yield [row._asdict() for row in rows]
+            last = rows[-1][0]
+
+    def build(self) -> None:
+        """
+        Reconstruye todo desde case_fact (estadisticas de estandarizacion
+        incluidas). La lectura y los vectores se arman sin tomar el lock, asi
+        que update() no espera; lo que llegue mientras tanto se aplica al final.
+        """
+        with self._lock:
+            self.building = True
+            self._pending = []
+        try:
+            with Session(self._engine()) as session:
+                raw_chunks, ids = [], []
+                for facts in self._read_facts(session):
+                    raw_chunks.append(np.array([raw_features(f) for f in facts], dtype=np.float32).reshape(-1, DIM))
+                    ids.extend(f["case_id"] for f in facts)
+            raw = np.concatenate(raw_chunks) if raw_chunks else np.zeros((0, DIM), dtype=np.float32)
+
+            numeric = raw[:, :len(NUMERIC)]
+            mean, std = self.mean, self.std
+            if len(raw):
+                mean = np.nan_to_num(np.nanmean(numeric, axis=0)).astype(np.float32)
+                std = np.nan_to_num(np.nanstd(numeric, axis=0)).astype(np.float32)
+                std[std == 0] = 1.0
+            numeric = (numeric - mean) / std
+            numeric[np.isnan(numeric)] = 0.0
+            raw[:, :len(NUMERIC)] = numeric
+
+        except Exception:
+            with self._lock:
+                self.building = False
+            raise
+        with self._lock:
+            self._install(raw, ids, mean, std)
+            self.building = False
+            pending, self._pending = self._pending, []
+            self.update(pending)
+
+    def _install(self, raw: np.ndarray, ids: List[int], mean: np.ndarray, std: np.ndarray) -> None:
+        self.mean, self.std = mean, std
+        self.count = 0
+        self.matrix = np.zeros((0, DIM), dtype=np.float32)
+        self.unit = np.zeros((0, DIM), dtype=np.float32)
+        self.case_ids = np.zeros(0, dtype=np.int64)
+        self.assign = np.zeros(0, dtype=np.int32)
+        self._reserve(len(raw))
+        self.matrix[:len(raw)] = raw
+        self.unit[:len(raw)] = self._normalize(raw)
+        self.case_ids[:len(raw)] = ids
+        self.count = len(raw)
+        self.row_of = {case_id: row for row, case_id in enumerate(ids)}
+        self.max_case_id = max(ids) if ids else 0
+        self.centroids = None
+        if self.count >= IVF_THRESHOLD:
+            self._train_quantizer()
+        self.built = True
+
+    def update(self, facts: Iterable[Dict[str, Any]]) -> None:
+        """Inserta o reemplaza vectores de filas de case_fact ya confirmadas"""
+        facts = list(facts)
+        if not facts:
+            return
+        with self._lock:
+            if self.building:
+                # build() lee case_fact sin lock: esto puede llegarle tarde
+                self._pending.extend(facts)
+            if not self.built:
+                return  # build() lo arma completo
+            vectors = self._vectors(facts)
+            unit = self._normalize(vectors)
+            new = [f["case_id"] for f in facts if f["case_id"] not in self.row_of]
+            self._reserve(self.count + len(new))
+            for fact, vector, unit_vector in zip(facts, vectors, unit):
+                case_id = fact["case_id"]
+                row = self.row_of.get(case_id)
+                if row is None:
+                    row = self.row_of[case_id] = self.count
+                    self.case_ids[row] = case_id
+                    self.count += 1
+                    self.max_case_id = max(self.max_case_id, case_id)
+                self.matrix[row] = vector
+                self.unit[row] = unit_vector
+                if self.centroids is not None:
+                    self.assign[row] = self._nearest_centroid(unit_vector[None, :])[0]
+            if self.centroids is None and self.count >= IVF_THRESHOLD:
+                self._train_quantizer()
+
+    def _catch_up(self) -> None:
+        with Session(self._engine()) as session:
+            for facts in self._read_facts(session, self.max_case_id):
+                self.update(facts)
+
+    def _build_logged(self) -> None:
+        try:
+            self.build()
+            logger.info(f"Similarity index built: {self.count} cases")
+        except Exception:
+            # el proximo similar() lo vuelve a intentar
+            logger.exception("Similarity index build failed")
+
+    def build_in_background(self) -> threading.Thread:
+        """Arranca build() en un hilo, salvo que ya haya uno en curso"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._build_logged, name="similarity-build", daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def ensure_ready(self) -> None:
+        """Incorpora los casos nuevos; si el indice no esta armado lanza IndexNotReady y lo arma en un hilo"""
+        if not self.built:
+            self.build_in_background()
+            raise IndexNotReady()
+        with self._lock:
+            self._catch_up()
+
+    # -- consulta --
+    def similar(self, case_id: int, k: int = 10, metric: str = "cosine",
+                nprobe: int = NPROBE) -> Optional[List[Dict[str, Any]]]:
+        """
+        Los k casos mas parecidos (sin incluir al propio); None si el caso no
+        esta indexado. IndexNotReady mientras el indice se construye.
+        """
+        self.ensure_ready()
+        with self._lock:
+            row = self.row_of.get(case_id)
+            if row is None:
+                return None
+            n = self.count
+            if self.centroids is not None:
+                query_cells = np.argsort(-(self.centroids @ self.unit[row]))[:nprobe]
+                candidates = np.flatnonzero(np.isin(self.assign[:n], query_cells))
+            else:
+                candidates = np.arange(n)
+            candidates = candidates[candidates != row]
+            if len(candidates) == 0:
+                return []
+
+            if metric == "euclidean":
+                diff = self.matrix[candidates] - self.matrix[row]
+                scores = np.einsum("ij,ij->i", diff, diff)  # distancia al cuadrado: menor es mejor
+            else:
+                scores = -(self.unit[candidates] @ self.unit[row])  # negado para ordenar ascendente
+
+            k = min(k, len(scores))
+            top = np.argpartition(scores, k - 1)[:k]
+            top = top[np.argsort(scores[top])]
+            return [
+                {
+                    "case_id": int(self.case_ids[candidates[i]]),
+                    "distance" if metric == "euclidean" else "similarity":
+                        float(np.sqrt(scores[i])) if metric == "euclidean" else float(-scores[i]),
+                }
+                for i in top
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cases": self.count,
+                "dimensions": DIM,
+                "cells": 0 if self.centroids is None else len(self.centroids),
+                "bytes": int(self.matrix.nbytes + self.unit.nbytes + self.case_ids.nbytes + self.assign.nbytes),
+            }
+
+
+similarity_index = SimilarityIndex()
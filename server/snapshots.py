@@ -0,0 +1,99 @@
+"""
+Snapshot periodico de la base para consultas analiticas.
+
+Con ANALYTICS_SNAPSHOT_PATH definido, un hilo copia la base primaria cada
+ANALYTICS_SNAPSHOT_INTERVAL segundos con la API de backup de SQLite y la deja
+en ese archivo (se reemplaza de forma atomica). /stats y /analytics/* leen de
+la copia, asi que los reportes nunca compiten con las escrituras; a cambio
+pueden ir hasta un intervalo atrasados.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from sqlmodel import Session, create_engine
+from server.db import engine, next_read_engine, wants_primary
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH")
+SNAPSHOT_INTERVAL = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "300"))
+
+snapshot_engine = None
+last_snapshot_at: Optional[float] = None
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def take_snapshot(path: Optional[str] = None) -> bool:
+    """Copia la base primaria a `path`. Solo aplica si el primario es SQLite"""
+    global snapshot_engine, last_snapshot_at
+    path = path or SNAPSHOT_PATH
+    if not path:
+        return False
+    if engine.dialect.name != "sqlite":
+        logger.warning("Analytics snapshots need a SQLite primary; skipping")
+        return False
+
+    tmp_path = f"{path}.tmp"
+    t0 = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            raw.driver_connection.backup(target)
+        finally:
+            target.close()
+    finally:
+        raw.close()
+    os.replace(tmp_path, path)
+
+    if snapshot_engine is None:
+        snapshot_engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+    else:
+        # las conexiones nuevas abren el archivo nuevo
+        snapshot_engine.dispose()
+    last_snapshot_at = time.time()
+    logger.info(f"Analytics snapshot written to {path} in {time.perf_counter() - t0:.3f}s")
+    return True
+
+
+def _loop() -> None:
+    while not _stop.wait(SNAPSHOT_INTERVAL):
+        try:
+            take_snapshot()
+        except Exception as e:
+            logger.error(f"Analytics snapshot failed: {e}")
+
+
+def start() -> None:
+    """Toma el primer snapshot y arranca el hilo periodico (si esta configurado)"""
+    global _thread
+    if not SNAPSHOT_PATH or _thread is not None:
+        return
+    if not take_snapshot():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="analytics-snapshot", daemon=True)
+    _thread.start()
+
+
+def stop() -> None:
+    global _thread
+    _stop.set()
+    _thread = None
+
+
+def get_analytics_session(request: Request):
+    # snapshot si existe; si no, el mismo ruteo que cualquier lectura
+    if wants_primary(request):
+        target = engine
+    elif snapshot_engine is not None:
+        target = snapshot_engine
+    else:
+        target = next_read_engine()
+    with Session(target) as session:
+        yield session
@@ -0,0 +1,169 @@
+"""
+Proteccion de la API ante rafagas de lecturas.
+
+- SingleFlightMiddleware: GETs identicos (misma ruta y query) que llegan
+  mientras otro igual esta en curso no vuelven a consultar la base; esperan
+  la respuesta del primero y cada uno recibe su propia copia (los middlewares
+  de afuera, como CORS, agregan sus headers por request sobre el mensaje).
+  Es lo que pasa cuando muchos dashboards cargan a la vez (/stats,
+  /claims?per_page=100, ...). No guarda nada despues de responder, asi que
+  no hay datos viejos que invalidar.
+- RateLimitMiddleware: token bucket por cliente (RATE_LIMIT_RPS tokens por
+  segundo, hasta RATE_LIMIT_BURST acumulados). Sin tokens responde 429 con
+  Retry-After.
+
+Son middlewares ASGI puros (no BaseHTTPMiddleware) para no meter otra tarea
+por request en el camino caliente.
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.requests import Request
+from server.db import wants_primary
+
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "20"))  # 0 desactiva el limite
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+# Detras de un proxy la IP real viene en X-Forwarded-For; solo confiar si lo hay
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+EXEMPT_PATHS = ("/health",)
+MAX_BUCKETS = 10_000
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, rate: float, capacity: float, now: float) -> float:
+        """Consume un token; devuelve 0 si pudo o los segundos hasta el proximo"""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class RateLimiter:
+    def __init__(self, rate: float = RATE_LIMIT_RPS, burst: float = RATE_LIMIT_BURST):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        # un bucket que ya se relleno por completo es igual a uno nuevo
+        full_after = self.capacity / self.rate
+        for client in [c for c, b in self._buckets.items() if now - b.updated > full_after]:
+            del self._buckets[client]
+
+    def check(self, client: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self._buckets[client] = TokenBucket(self.capacity, now)
+            return bucket.take(self.rate, self.capacity, now)
+
+
+def client_key(scope: Dict[str, Any]) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or RateLimiter()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or self.limiter.rate <= 0
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+        wait = self.limiter.check(client_key(scope))
+        if not wait:
+            await self.app(scope, receive, send)
+            return
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(wait)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _copy_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    # los headers son una lista que los middlewares de afuera modifican en el lugar
+    copy = dict(message)
+    if "headers" in copy:
+        copy["headers"] = list(copy["headers"])
+    return copy
+
+
+class _Flight:
+    __slots__ = ("done", "messages")
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.messages: Optional[List[Dict[str, Any]]] = None  # None = el lider fallo
+
+
+class SingleFlightMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._flights: Dict[Tuple[str, bytes], _Flight] = {}
+
+    async def __call__(self, scope, receive, send):
+        # read-your-writes va al primario y no debe recibir la respuesta de una replica
+        if scope["type"] != "http" or scope["method"] != "GET" or wants_primary(Request(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        key = (scope["path"], scope.get("query_string", b""))
+        flight = self._flights.get(key)
+        if flight is not None:
+            await flight.done.wait()
+            if flight.messages is None:
+                await self.app(scope, receive, send)
+                return
+            for message in flight.messages:
+                await send(_copy_message(message))
+            return
+
+        flight = self._flights[key] = _Flight()
+        messages: List[Dict[str, Any]] = []
+
+        async def record(message):
+            # se guarda antes de que CORS y compania le agreguen lo del lider
+            messages.append(_copy_message(message))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, record)
+            flight.messages = messages
+        finally:
+            # los que lleguen desde aqui hacen su propia consulta
+            del self._flights[key]
+            flight.done.set()
@@ -0,0 +1,46 @@
+"""
+Configuracion comun de los tests: una base SQLite temporal y directorios de
+jobs propios. Las variables se fijan antes de importar server, porque db.py
+crea el engine al importarse (y los workers de jobs las heredan).
+"""
+import os
+import tempfile
+
+TMP_DIR = tempfile.mkdtemp(prefix="insurance-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'test.db')}"
+os.environ["RATE_LIMIT_RPS"] = "0"
+os.environ["JOB_UPLOAD_DIR"] = os.path.join(TMP_DIR, "uploads")
+os.environ["JOB_IMPORT_DIRS"] = TMP_DIR
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server.benchmark import generate_csv
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from server.db import init_db
+    init_db()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from server.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def claims_csv():
+    """Arma un CSV de prueba de `rows` filas dentro de JOB_IMPORT_DIRS"""
+    created = []
+
+    def make(rows: int, seed: int = 42) -> str:
+        path = os.path.join(TMP_DIR, f"claims-{len(created)}-{rows}-{seed}.csv")
+        created.append(generate_csv(path, rows, seed=seed))
+        return path
+
+    yield make
+    for path in created:
+        os.remove(path)
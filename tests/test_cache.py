@@ -0,0 +1,33 @@
+from sqlmodel import Session
+
+from server.cache import dimension_cache
+from server.changes import record_change
+from server.db import engine
+from server.models import Policy
+
+
+def write_elsewhere(obj, op):
+    # lo que haria otro worker: base y change_log, sin pasar por el cache de este proceso
+    with Session(engine) as session:
+        session.add(obj)
+        session.flush()
+        record_change(session, obj, op)
+        session.commit()
+        session.refresh(obj)
+        return obj
+
+
+def test_cache_sees_writes_from_other_workers(client):
+    policy = write_elsewhere(Policy(policy_number=555000111, policy_state="OH", deductible=500), "create")
+    client.cookies.clear()  # sin la cookie de escritura reciente, las lecturas pasan por el cache
+    dimension_cache.invalidate()
+    dimension_cache.warm()
+    assert client.get(f"/policies/{policy.id}").json()["deductible"] == 500
+
+    policy.deductible = 2000
+    write_elsewhere(policy, "update")
+    created = write_elsewhere(Policy(policy_number=555000222, policy_state="IN"), "create")
+
+    assert client.get(f"/policies/{policy.id}").json()["deductible"] == 2000
+    # el loader de este proceso tambien ve la poliza nueva sin esperar el TTL
+    assert dimension_cache.find_id(Policy, 555000222) == created.id
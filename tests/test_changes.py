@@ -0,0 +1,45 @@
+def latest_rev(client):
+    page = client.get("/changes", params={"since": 0, "limit": 1000}).json()
+    while page["has_more"]:
+        page = client.get("/changes", params={"since": page["next"], "limit": 1000}).json()
+    return page["next"]
+
+
+def test_partition_realignment_is_in_the_feed(client):
+    incident = client.post("/incidents", json={"incident_state": "NY", "date": "2020-03-01"}).json()
+    claim = client.post("/claims", json={"total_claim_amount": 100}).json()
+    assert claim["partition_key"] is None
+    since = latest_rev(client)
+
+    client.post("/cases", json={"incident_id": incident["id"], "claim_id": claim["id"]})
+
+    changes = client.get("/changes", params={"since": since}).json()["changes"]
+    claim_updates = [c for c in changes if c["entity"] == "claim" and c["entity_id"] == claim["id"]]
+    assert claim_updates and claim_updates[-1]["op"] == "update"
+    assert claim_updates[-1]["payload"]["partition_key"] == "NY-2020"
+
+
+def test_changes_pages_in_rev_order_without_gaps(client):
+    since = latest_rev(client)
+    created = [client.post("/vehicles", json={"make": "Saab", "model": "95", "year": 2000 + i}).json() for i in range(5)]
+    client.put(f"/vehicles/{created[0]['id']}", json={"year": 1999})
+
+    seen, cursor, pages = [], since, 0
+    while True:
+        page = client.get("/changes", params={"since": cursor, "limit": 2}).json()
+        pages += 1
+        assert len(page["changes"]) <= 2
+        seen.extend(page["changes"])
+        assert page["next"] == (page["changes"][-1]["rev"] if page["changes"] else cursor)
+        cursor = page["next"]
+        if not page["has_more"]:
+            break
+
+    assert pages == 3
+    revs = [c["rev"] for c in seen]
+    assert revs == sorted(revs) and len(set(revs)) == 6 and revs[0] > since
+    assert [(c["entity_id"], c["op"]) for c in seen] == [(v["id"], "create") for v in created] + [(created[0]["id"], "update")]
+    assert seen[-1]["payload"]["year"] == 1999
+
+    # al dia: pagina vacia con el mismo cursor
+    assert client.get("/changes", params={"since": cursor}).json() == {"changes": [], "next": cursor, "has_more": False}
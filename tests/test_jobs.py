@@ -0,0 +1,72 @@
+import time
+
+FINISHED = ("completed", "failed", "cancelled", "interrupted")
+
+
+def wait_for(client, job_id, done, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if done(job):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} did not get there in {timeout}s: {job}")
+
+
+def test_writes_during_job_do_not_lock_out(client, claims_csv):
+    path = claims_csv(3000)
+    before = client.get("/stats").json()["total_cases"]
+    policy = client.post("/policies", json={"policy_number": 900001}).json()
+    job = client.post("/jobs/import", data={"path": path, "batch_size": "100"}).json()
+
+    statuses = []
+    current = job
+    deadline = time.monotonic() + 120
+    while current["status"] not in FINISHED and time.monotonic() < deadline:
+        response = client.put(f"/policies/{policy['id']}", json={"policy_state": f"S{len(statuses) % 9}"})
+        statuses.append(response.status_code)
+        current = client.get(f"/jobs/{job['id']}").json()
+
+    assert current["status"] == "completed", current["error"]
+    assert set(statuses) == {200}
+    assert client.get("/stats").json()["total_cases"] == before + 3000
+
+
+def test_cancel_then_resume_loads_every_row_once(client, claims_csv):
+    path = claims_csv(4000, seed=5)
+    before = client.get("/stats").json()["total_cases"]
+    job = client.post("/jobs/import", data={"path": path, "batch_size": "50"})
+    assert job.status_code == 202
+    job = job.json()
+    assert job["status"] == "queued"
+
+    wait_for(client, job["id"], lambda j: j["rows_done"] > 0)
+    response = client.post(f"/jobs/{job['id']}/cancel")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelling"
+    cancelled = wait_for(client, job["id"], lambda j: j["status"] in FINISHED)
+    assert cancelled["status"] == "cancelled"
+    assert 0 < cancelled["rows_done"] < 4000
+    assert cancelled["rows_done"] % 50 == 0  # se corta al cerrar un lote
+    assert client.get("/stats").json()["total_cases"] == before + cancelled["rows_done"]
+    assert client.post(f"/jobs/{job['id']}/cancel").status_code == 409
+
+    assert client.post(f"/jobs/{job['id']}/resume").status_code == 202
+    done = wait_for(client, job["id"], lambda j: j["status"] in FINISHED)
+    assert done["status"] == "completed", done["error"]
+    assert done["rows_done"] == done["rows_total"] == 4000
+    assert done["stats"]["cases_created"] == 4000
+    assert client.get("/stats").json()["total_cases"] == before + 4000
+    assert client.post(f"/jobs/{job['id']}/resume").status_code == 409
+
+
+def test_submit_upload_and_reject_paths_outside_import_dirs(client, claims_csv):
+    with open(claims_csv(20, seed=9), "rb") as fh:
+        job = client.post("/jobs/import", files={"file": ("claims.csv", fh, "text/csv")}).json()
+    done = wait_for(client, job["id"], lambda j: j["status"] in FINISHED)
+    assert done["status"] == "completed", done["error"]
+    assert done["rows_done"] == 20 and done["progress"] == 1
+
+    assert client.post("/jobs/import", data={"path": "/etc/passwd"}).status_code == 400
+    assert client.post("/jobs/import").status_code == 400
+    assert client.get("/jobs/999999").status_code == 404
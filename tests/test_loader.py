@@ -0,0 +1,68 @@
+import csv
+
+from sqlmodel import Session, select
+
+from server.add_data import load_to_database
+from server.cache import DimensionCache, dimension_cache
+from server.db import engine
+from server.models import Case, DataProfile, Insured, Policy, Vehicle
+
+
+def rewrite(path, edit):
+    with open(path, newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    edit(rows)
+    with open(path, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def test_bad_rows_only_evict_what_they_created(claims_csv, monkeypatch):
+    expected = []
+
+    def edit(rows):
+        # fila 5: crea sus dimensiones y falla en el incidente; la 6 reusa
+        # la poliza de la 5, que ya no existe
+        rows[4]["policy_number"] = rows[5]["policy_number"] = "987654321"
+        for row in rows[:5]:
+            row["incident_date"] = "not-a-date"
+        expected.extend(int(row["policy_number"]) for row in rows[5:])
+
+    path = rewrite(claims_csv(30, seed=11), edit)
+
+    dimension_cache.invalidate()
+    dimension_cache.warm()
+    loads = []
+    original = DimensionCache._load
+    monkeypatch.setattr(DimensionCache, "_load", lambda self, model: loads.append(model) or original(self, model))
+
+    stats = load_to_database(path, lean=False)
+
+    assert len(stats["errors"]) == 5
+    assert stats["rows_processed"] == 25
+    assert loads == []
+    with Session(engine) as session:
+        for model, column in ((Insured, Case.insured_id), (Policy, Case.policy_id), (Vehicle, Case.vehicle_id)):
+            orphans = session.exec(
+                select(Case.id).outerjoin(model, model.id == column).where(column != None, model.id == None)  # noqa: E711
+            ).all()
+            assert orphans == []
+        assert len(session.exec(select(Policy).where(Policy.policy_number == 987654321)).all()) == 1
+        loaded = session.exec(
+            select(Policy.policy_number).join(Case, Case.policy_id == Policy.id).order_by(Case.id.desc()).limit(25)
+        ).all()
+        assert loaded[::-1] == expected
+
+
+def test_profile_only_when_asked(claims_csv):
+    def profiles():
+        with Session(engine) as session:
+            return len(session.exec(select(DataProfile.id)).all())
+
+    before = profiles()
+    assert load_to_database(claims_csv(10, seed=3))["rows_processed"] == 10
+    assert profiles() == before
+    assert load_to_database(claims_csv(10, seed=4), profile=True)["rows_processed"] == 10
+    assert profiles() == before + 1
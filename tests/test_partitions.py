@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from server import partitions
+from server.db import engine
+from server.models import Incident, PartitionCatalog
+
+
+@pytest.mark.parametrize("upsert", [True, False], ids=["on-conflict", "select-then-insert"])
+def test_incident_writes_register_their_partition(monkeypatch, upsert):
+    if not upsert:
+        monkeypatch.setattr(partitions, "on_conflict_insert", lambda bind: None)
+    state = "QA" if upsert else "QB"
+    with Session(engine) as session:
+        for _ in range(2):
+            session.add(Incident(incident_state=state))
+        session.flush()
+        partitions.register_keys(session, [f"{state}-?", None])
+        keys = session.exec(select(PartitionCatalog.key).where(PartitionCatalog.key.like(f"{state}-%"))).all()
+        assert keys == [f"{state}-?"]
+        session.rollback()
+
+
+def test_prune_reads_only_the_catalog(client):
+    client.post("/incidents", json={"incident_state": "QC", "date": "2001-05-06"})
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        with Session(engine) as session:
+            assert partitions.prune(session, state="QC") == ["QC-2001"]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 1 and "partition_catalog" in statements[0]
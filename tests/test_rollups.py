@@ -0,0 +1,48 @@
+import datetime as dt
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import mysql, postgresql
+from sqlmodel import Session, select
+
+from server import rollups
+from server.db import engine, on_conflict_insert
+from server.models import ClaimRollup
+
+DAY = dt.date(1990, 1, 2)
+
+
+def fact(amount, fraud=False, state="TX"):
+    return {"incident_date": DAY, "incident_state": state, "claim_id": 1,
+            "total_claim_amount": amount, "fraud_reported": fraud}
+
+
+def bucket(session):
+    return session.exec(select(ClaimRollup).where(ClaimRollup.day == DAY)).first()
+
+
+@pytest.mark.parametrize("upsert", [True, False], ids=["on-conflict", "update-then-insert"])
+def test_apply_fact_delta(monkeypatch, upsert):
+    if not upsert:
+        monkeypatch.setattr(rollups, "on_conflict_insert", lambda bind: None)
+    with Session(engine) as session:
+        rollups.apply_fact_delta(session, [], [fact(100), fact(50, fraud=True)])
+        rollups.apply_fact_delta(session, [fact(100)], [fact(30)])
+        row = bucket(session)
+        assert (row.claims, row.claim_amount, row.fraud_claims) == (2, 80, 1)
+        rollups.apply_fact_delta(session, [fact(30), fact(50, fraud=True)], [])
+        session.expire_all()
+        assert bucket(session) is None
+        session.rollback()
+
+
+def test_on_conflict_insert_follows_the_dialect():
+    postgres = SimpleNamespace(dialect=postgresql.dialect())
+    insert = on_conflict_insert(postgres)
+    stmt = insert(ClaimRollup).values([{"day": DAY, "state": "", "claims": 1, "claim_amount": 0, "fraud_claims": 0}])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ClaimRollup.day, ClaimRollup.state],
+        set_={"claims": ClaimRollup.claims + stmt.excluded.claims},
+    )
+    assert "ON CONFLICT (day, state) DO UPDATE" in str(stmt.compile(dialect=postgres.dialect))
+    assert on_conflict_insert(SimpleNamespace(dialect=mysql.dialect())) is None
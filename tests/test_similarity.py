@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+from sqlmodel import Session, select
+
+import server.similarity as similarity
+from server.add_data import load_to_database
+from server.db import engine
+from server.models import CaseFact
+from server.similarity import IndexNotReady, SimilarityIndex
+
+
+class GatedIndex(SimilarityIndex):
+    """build() se queda esperando despues de leer case_fact hasta que se abra la compuerta"""
+
+    def __init__(self):
+        super().__init__(engine)
+        self.read = threading.Event()
+        self.gate = threading.Event()
+
+    def _read_facts(self, session, after_case_id=0, batch=50_000):
+        yield from super()._read_facts(session, after_case_id, batch)
+        if not self.built:
+            self.read.set()
+            self.gate.wait(10)
+
+
+@pytest.fixture
+def facts(claims_csv):
+    load_to_database(claims_csv(20, seed=7))
+    with Session(engine) as session:
+        rows = session.exec(select(CaseFact).order_by(CaseFact.case_id.desc()).limit(20)).all()
+        return [row.model_dump() for row in rows]
+
+
+def test_similar_answers_503_until_the_index_is_built(client, facts, monkeypatch):
+    index = GatedIndex()
+    monkeypatch.setattr(similarity, "similarity_index", index)
+    case_id = facts[0]["case_id"]
+
+    response = client.get(f"/cases/{case_id}/similar")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    assert index.read.wait(10)
+
+    index.gate.set()
+    index._thread.join(10)
+    response = client.get(f"/cases/{case_id}/similar", params={"k": 5})
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 5
+
+
+def test_updates_during_build_are_not_lost(facts):
+    index = GatedIndex()
+    with pytest.raises(IndexNotReady):
+        index.similar(facts[0]["case_id"])
+    assert index.read.wait(10)
+
+    # un commit que refresca case_fact mientras build() ya leyo la tabla
+    changed = {**facts[0], "total_claim_amount": facts[0]["total_claim_amount"] * 10}
+    index.update([changed])
+    index.gate.set()
+    index._thread.join(10)
+
+    assert index.built
+    assert (index.matrix[index.row_of[changed["case_id"]]] == index._vectors([changed])[0]).all()
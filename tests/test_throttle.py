@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+
+import server.throttle as throttle
+from server.throttle import RateLimiter, RateLimitMiddleware, SingleFlightMiddleware
+
+
+def single_flight_app() -> FastAPI:
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/slow")
+    async def slow():
+        app.state.calls += 1
+        await asyncio.sleep(0.2)
+        return {"calls": app.state.calls}
+
+    # mismo orden que main.py: CORS por fuera de single-flight
+    app.add_middleware(SingleFlightMiddleware)
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True)
+    return app
+
+
+def test_single_flight_does_not_leak_cors_headers_between_clients():
+    app = single_flight_app()
+    origins = ["http://a.example", None, "http://c.example", None, "http://e.example"]
+
+    async def fire():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http:
+            async def get(origin):
+                headers = {"Origin": origin} if origin else {}
+                return await http.get("/slow", headers=headers)
+            return await asyncio.gather(*(get(origin) for origin in origins))
+
+    responses = asyncio.run(fire())
+
+    assert app.state.calls == 1
+    assert all(r.json() == {"calls": 1} for r in responses)
+    for origin, response in zip(origins, responses):
+        assert response.headers.get("access-control-allow-origin") == origin
+        assert response.headers.get("vary") == "Origin"
+
+
+def test_rate_limit_answers_429_per_client_until_tokens_refill(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(throttle, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    app.add_middleware(RateLimitMiddleware, limiter=RateLimiter(rate=2, burst=3))
+    first = TestClient(app, client=("10.0.0.1", 1000))
+    second = TestClient(app, client=("10.0.0.2", 1000))
+
+    assert [first.get("/ping").status_code for _ in range(3)] == [200, 200, 200]
+    limited = first.get("/ping")
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "1"
+    assert limited.json() == {"detail": "Too many requests"}
+    # cada cliente tiene su bucket; /health no consume tokens
+    assert second.get("/ping").status_code == 200
+    assert first.get("/health").status_code == 200
+
+    clock.now += 0.5  # rate=2: medio segundo rinde un token
+    assert first.get("/ping").status_code == 200
+    assert first.get("/ping").status_code == 429